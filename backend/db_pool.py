@@ -0,0 +1,76 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Per-worker pool of read-only SQLite connections for the Flask server.
+# Connections are checked out by one request at a time, so they are safe to
+# hand between threads (and gevent greenlets) with check_same_thread=False.
+
+MAX_IDLE = 8
+BUSY_TIMEOUT = 10
+STATEMENT_CACHE = 256  # prepared statements kept per connection
+
+
+def dict_row_factory():
+    # Row factory returning dicts, with the column names worked out once per query
+    # rather than once per row. cursor.description is the same tuple for every row of
+    # a query and a new one after each execute, so an identity check spots a new query.
+    # Each connection gets its own factory: it is only used by one thread at a time.
+    last = [None, None]  # description, column names
+
+    def dict_row(cursor, row):
+        description = cursor.description
+        if description is not last[0]:
+            last[0], last[1] = description, [col[0] for col in description]
+        return dict(zip(last[1], row))
+
+    return dict_row
+
+
+class ReadOnlyPool:
+    def __init__(self, db_file, max_idle=MAX_IDLE):
+        self.db_file = db_file
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._pid = None
+        self._idle = None
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            f"file:{self.db_file}?mode=ro",
+            uri=True,
+            timeout=BUSY_TIMEOUT,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE,
+        )
+        conn.execute("PRAGMA query_only = ON")
+        conn.row_factory = dict_row_factory()
+        return conn
+
+    def _idle_queue(self):
+        # gunicorn forks workers after import; never reuse a parent's connections
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._idle = queue.LifoQueue()
+            return self._idle
+
+    @contextmanager
+    def connection(self):
+        idle = self._idle_queue()
+        try:
+            conn = idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        except Exception:
+            conn.close()  # don't return a connection in an unknown state
+            raise
+        else:
+            if idle is self._idle and idle.qsize() < self.max_idle:
+                idle.put(conn)
+            else:
+                conn.close()
@@ -1,42 +1,143 @@
 -- Schema for all_cruises.db
+-- Kept in sync with the migrations in price_trackers/migrate.py
 
 -- To create new db (if needed):
     -- Delete old db file
     -- Run command in bash terminal:
         -- sqlite3 all_cruises.db < db_schema.sql
+-- To upgrade an existing db (keeps its data, writes all_cruises.db.bak first):
+    -- python -m price_trackers.migrate
+-- To also fold unchanged daily prices already stored into valid_to ranges:
+    -- python -m price_trackers.migrate --compact
 
--- P&O Cruises
-CREATE TABLE IF NOT EXISTS po_cruises (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    date_checked   TEXT,
-    cruise_code    TEXT,
+-- One row per tracked sailing; details are refreshed on every run
+CREATE TABLE IF NOT EXISTS sailings (
+    id             INTEGER PRIMARY KEY,
+    line           TEXT NOT NULL,       -- 'po' or 'princess'
+    cruise_code    TEXT NOT NULL,
     cruise_name    TEXT,
     ship_name      TEXT,
     departure_port TEXT,
-    departure_date TEXT,
+    departure_date TEXT,                -- yyyy-mm-dd
     duration       INTEGER,
-    cabin_type     TEXT,
-    fare_type      TEXT,
-    cabin_price    REAL,
-    fixed_obc      REAL,
-    bonus_obc      REAL,
-    total_price    REAL,
-    drinks_price   REAL
-);
-
--- Princess Cruises
-CREATE TABLE IF NOT EXISTS princess_cruises (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    date_checked   TEXT,
-    cruise_code    TEXT,
-    cruise_name    TEXT,
-    ship_name      TEXT,
-    departure_port TEXT,
-    departure_date TEXT,
-    duration       INTEGER,
-    cabin_type     TEXT,
-    fare_type      TEXT,
-    cabin_price    REAL,
-    obc            REAL,
-    total_price    REAL
+    UNIQUE (line, cruise_code)
+);
+
+-- Prices for a sailing / cabin / fare, valid from date_checked to valid_to.
+-- With "dedupe" on in a tracker's config, unchanged prices extend valid_to instead of adding a row
+CREATE TABLE IF NOT EXISTS price_observations (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    sailing_id   INTEGER NOT NULL REFERENCES sailings(id),
+    date_checked TEXT NOT NULL,         -- yyyy-mm-dd
+    cabin_type   TEXT NOT NULL,
+    fare_type    TEXT NOT NULL,
+    cabin_price  REAL,
+    fixed_obc    REAL,                  -- P&O only
+    bonus_obc    REAL,                  -- P&O only
+    obc          REAL,                  -- Princess only
+    total_price  REAL,
+    drinks_price REAL,                  -- P&O only
+    valid_to     TEXT,                  -- yyyy-mm-dd, last day these prices were seen
+    revision     INTEGER                -- bumped on every insert / extension (delta sync cursor)
 );
+
+CREATE INDEX IF NOT EXISTS idx_observations_series
+    ON price_observations (sailing_id, cabin_type, fare_type, date_checked);
+CREATE INDEX IF NOT EXISTS idx_observations_date
+    ON price_observations (date_checked);
+CREATE INDEX IF NOT EXISTS idx_observations_revision
+    ON price_observations (revision);
+
+-- P&O Cruises (read-only view in the original flat layout)
+CREATE VIEW IF NOT EXISTS po_cruises AS
+SELECT o.id, o.date_checked, s.cruise_code, s.cruise_name, s.ship_name, s.departure_port,
+       CASE WHEN s.departure_date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+            THEN strftime('%d/%m/', s.departure_date) || substr(s.departure_date, 3, 2)
+            ELSE s.departure_date END AS departure_date,
+       s.duration, o.cabin_type, o.fare_type, o.cabin_price,
+       o.fixed_obc, o.bonus_obc, o.total_price, o.drinks_price, o.valid_to, o.revision
+FROM price_observations o
+JOIN sailings s ON s.id = o.sailing_id
+WHERE s.line = 'po';
+
+-- Princess Cruises (read-only view in the original flat layout)
+CREATE VIEW IF NOT EXISTS princess_cruises AS
+SELECT o.id, o.date_checked, s.cruise_code, s.cruise_name, s.ship_name, s.departure_port,
+       CASE WHEN s.departure_date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+            THEN strftime('%d/%m/%Y', s.departure_date)
+            ELSE s.departure_date END AS departure_date,
+       s.duration, o.cabin_type, o.fare_type, o.cabin_price,
+       o.obc, o.total_price, o.valid_to, o.revision
+FROM price_observations o
+JOIN sailings s ON s.id = o.sailing_id
+WHERE s.line = 'princess';
+
+-- Latest / previous / lowest total price per sailing, cabin and fare.
+-- Updated by the trackers as they insert, so it never needs a scan of the history
+CREATE TABLE IF NOT EXISTS price_summary (
+    sailing_id     INTEGER NOT NULL REFERENCES sailings(id),
+    cabin_type     TEXT NOT NULL,
+    fare_type      TEXT NOT NULL,
+    latest_date    TEXT,                -- yyyy-mm-dd
+    latest_price   REAL,
+    previous_date  TEXT,                -- last day before latest_date with a price
+    previous_price REAL,
+    lowest_price   REAL,                -- all-time low
+    lowest_date    TEXT,
+    min_7d         REAL,                -- lowest in the 7 / 30 days up to latest_date
+    min_30d        REAL,
+    PRIMARY KEY (sailing_id, cabin_type, fare_type)
+);
+
+-- One row per tracker run; finished_at stays NULL if the run was interrupted
+CREATE TABLE IF NOT EXISTS runs (
+    id          INTEGER PRIMARY KEY,
+    line        TEXT NOT NULL,
+    run_date    TEXT NOT NULL,          -- yyyy-mm-dd
+    started_at  TEXT NOT NULL,
+    finished_at TEXT
+);
+
+-- Cruise codes a run has finished with ('stored' or 'removed'), committed together
+-- with their observations; a resumed run skips them
+CREATE TABLE IF NOT EXISTS run_journal (
+    run_id      INTEGER NOT NULL REFERENCES runs(id),
+    cruise_code TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    cruise_name TEXT,
+    reason      TEXT,                   -- why a cruise was removed
+    PRIMARY KEY (run_id, cruise_code)
+);
+
+-- Daily exchange rates used to convert fares (e.g. Princess OBC from USD), one per pair and day
+CREATE TABLE IF NOT EXISTS fx_rates (
+    base       TEXT NOT NULL,               -- e.g. 'USD'
+    quote      TEXT NOT NULL,               -- e.g. 'GBP'; 1 base = rate quote
+    rate_date  TEXT NOT NULL,               -- yyyy-mm-dd
+    rate       REAL NOT NULL,
+    source     TEXT,                        -- provider the rate came from
+    fetched_at TEXT,
+    PRIMARY KEY (base, quote, rate_date)
+);
+
+-- When each tracked cruise is next due to be fetched, from its price volatility and
+-- days to departure (priority 0..1); only used by lines with a "schedule" config section
+CREATE TABLE IF NOT EXISTS schedule (
+    line         TEXT NOT NULL,
+    cruise_code  TEXT NOT NULL,
+    next_due     TEXT NOT NULL,             -- yyyy-mm-dd
+    priority     REAL NOT NULL,
+    last_checked TEXT,                      -- yyyy-mm-dd
+    PRIMARY KEY (line, cruise_code)
+);
+
+-- Bumped by migrate --compact whenever history rows are deleted; delta-sync clients
+-- (/changes) seeing a new epoch drop their stored rows and sync from the start
+CREATE TABLE IF NOT EXISTS sync_state (
+    id    INTEGER PRIMARY KEY CHECK (id = 1),
+    epoch INTEGER NOT NULL
+);
+
+INSERT OR IGNORE INTO sync_state (id, epoch) VALUES (1, 1);
+
+PRAGMA user_version = 7;
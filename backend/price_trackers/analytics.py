@@ -0,0 +1,170 @@
+import argparse
+from price_trackers import columnar
+from price_trackers.columnar import to_day, from_day
+
+try:
+    import numpy as np  # optional dependency - only this module needs it
+except ImportError:
+    np = None
+
+# Vectorized price analytics over columnar snapshots (see columnar.py). Every
+# function works on whole columns at once, so years of history for every cruise
+# take milliseconds and no per-row Python objects:
+#     python -m price_trackers.columnar
+#     python -m price_trackers.analytics po --from 2025-10-01 --to 2025-11-01 --cabin Balcony
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("price_trackers.analytics needs NumPy: pip install numpy")
+
+
+def row_series(snapshot):
+    # Series index of every row (series_start expanded to one entry per row)
+    _require_numpy()
+    starts = snapshot.columns["series_start"]
+    return np.repeat(np.arange(snapshot.series_count), np.diff(starts))
+
+
+def series_stats(snapshot, column="total_price"):
+    # Per series: lowest / highest price ever, first and last price, and the % change
+    # between them. Arrays are indexed by series; NaN prices are ignored by min / max.
+    _require_numpy()
+    values = snapshot.columns[column]
+    starts = snapshot.columns["series_start"]
+    if not len(values):
+        empty = np.empty(0)
+        return {"min": empty, "max": empty, "first": empty, "last": empty, "pct_change": empty}
+    first = values[starts[:-1]]
+    last = values[starts[1:] - 1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct_change = (last - first) / first * 100
+    return {
+        "min": np.fmin.reduceat(values, starts[:-1]),
+        "max": np.fmax.reduceat(values, starts[:-1]),
+        "first": first,
+        "last": last,
+        "pct_change": pct_change,
+    }
+
+
+def prices_on(snapshot, day, column="total_price"):
+    # Price of every series on one day (NaN where it wasn't on sale), cheapest if
+    # several stored rows cover the day
+    _require_numpy()
+    day = to_day(day) if isinstance(day, str) else day
+    c = snapshot.columns
+    covers = (c["day_from"] <= day) & (c["day_to"] >= day)
+    prices = np.full(snapshot.series_count, np.inf)
+    np.fmin.at(prices, row_series(snapshot)[covers], c[column][covers])
+    prices[np.isinf(prices)] = np.nan
+    return prices
+
+
+def daily_matrix(snapshot, series, day_from, day_to, column="total_price"):
+    # Dense (len(series), days) price matrix for day_from..day_to inclusive, NaN where a
+    # series has no price; rows follow the order of `series`
+    _require_numpy()
+    day_from = to_day(day_from) if isinstance(day_from, str) else day_from
+    day_to = to_day(day_to) if isinstance(day_to, str) else day_to
+    c = snapshot.columns
+    series = np.asarray(series)
+    matrix = np.full((len(series), day_to - day_from + 1), np.nan)
+
+    position = np.full(snapshot.series_count, -1)
+    position[series] = np.arange(len(series))
+    rows = np.nonzero((position[row_series(snapshot)] >= 0)
+                      & (c["day_to"] >= day_from) & (c["day_from"] <= day_to))[0]
+    start = np.maximum(c["day_from"][rows], day_from)
+    length = np.minimum(c["day_to"][rows], day_to) - start + 1
+    # One entry per (row, covered day), laid out row after row
+    row_index = np.repeat(rows, length)
+    offsets = np.arange(length.sum()) - np.repeat(np.cumsum(length) - length, length)
+    matrix[position[row_series(snapshot)[row_index]],
+           np.repeat(start - day_from, length) + offsets] = c[column][row_index]
+    return matrix
+
+
+def select(snapshot, cruise_code=None, cabin_type=None, fare_type=None):
+    # Series indices matching the filters (each a value or a collection of values)
+    _require_numpy()
+    c = snapshot.columns
+    mask = np.ones(snapshot.series_count, dtype=bool)
+    for values, codes, names in (
+        (cruise_code, c["series_sailing"], snapshot.sailings["cruise_code"]),
+        (cabin_type, c["series_cabin"], snapshot.dictionaries["cabin_type"]),
+        (fare_type, c["series_fare"], snapshot.dictionaries["fare_type"]),
+    ):
+        if values is None:
+            continue
+        wanted = {values} if isinstance(values, str) else set(values)
+        mask &= np.isin(codes, [i for i, name in enumerate(names) if name in wanted])
+    return np.nonzero(mask)[0]
+
+
+def compare(snapshot, day_from, day_to, series=None, column="total_price"):
+    # Cross-cruise comparison: each series' price on day_from and day_to and the change,
+    # biggest drop first. Series without a price on both days are left out.
+    _require_numpy()
+    series = np.arange(snapshot.series_count) if series is None else np.asarray(series)
+    before = prices_on(snapshot, day_from, column)[series]
+    after = prices_on(snapshot, day_to, column)[series]
+    keep = ~(np.isnan(before) | np.isnan(after))
+    series, before, after = series[keep], before[keep], after[keep]
+    pct_change = (after - before) / before * 100
+    rows = []
+    for j in np.argsort(pct_change, kind="stable"):
+        cruise_code, cabin_type, fare_type = snapshot.series_key(series[j])
+        rows.append({
+            "cruise_code": cruise_code,
+            "cruise_name": snapshot.sailings["cruise_name"][snapshot.columns["series_sailing"][series[j]]],
+            "cabin_type": cabin_type,
+            "fare_type": fare_type,
+            "before": float(before[j]),
+            "after": float(after[j]),
+            "change": round(float(after[j] - before[j]), 2),
+            "pct_change": round(float(pct_change[j]), 2),
+        })
+    return rows
+
+
+def date_range(snapshot):
+    # First and last day in the snapshot
+    _require_numpy()
+    c = snapshot.columns
+    if not len(c["day_from"]):
+        return None, None
+    return from_day(c["day_from"].min()), from_day(c["day_to"].max())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Biggest price moves between two days, from a columnar snapshot")
+    parser.add_argument("line", help="snapshot to read, e.g. po (see python -m price_trackers.columnar)")
+    parser.add_argument("--from", dest="day_from", help="first day (default: --days before the last day)")
+    parser.add_argument("--to", dest="day_to", help="last day (default: last day in the snapshot)")
+    parser.add_argument("--days", type=int, default=30, help="period to compare when --from isn't given")
+    parser.add_argument("--cabin", nargs="+", help="cabin types to compare")
+    parser.add_argument("--fare", nargs="+", help="fare types to compare")
+    parser.add_argument("--top", type=int, default=10, help="rows to print")
+    parser.add_argument("--snapshots", default=columnar.SNAPSHOT_DIR, help="directory holding <line>.cols")
+    args = parser.parse_args(argv)
+
+    _require_numpy()
+    snapshot = columnar.load(args.line, args.snapshots)
+    _, last_day = date_range(snapshot)
+    if last_day is None:
+        print(f"No history in the {args.line} snapshot")
+        return []
+    day_to = args.day_to or last_day
+    day_from = args.day_from or from_day(to_day(day_to) - args.days)
+    rows = compare(snapshot, day_from, day_to, select(snapshot, cabin_type=args.cabin, fare_type=args.fare))
+
+    print(f"\n=== {args.line} price changes {day_from} -> {day_to} ({len(rows)} fares) ===")
+    for row in rows[:args.top]:
+        print(f"{row['cruise_code']:<8} {row['cabin_type']:<10} {row['fare_type']:<10} "
+              f"{row['before']:>9.2f} -> {row['after']:>9.2f} {row['pct_change']:>+7.1f}%  {row['cruise_name']}")
+    return rows
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import json
+import argparse
+import tempfile
+from pathlib import Path
+from datetime import date, timedelta
+import requests
+from price_trackers import tracker, fixtures
+
+# End-to-end benchmark of every tracker against the local stand-in server:
+#     python -m price_trackers.benchmark --sizes 10 100 1000 --latency 0.05 --error-rate 0.02
+#
+# Responses are synthetic fixtures shaped like the live APIs, one per cruise code, so
+# runs are repeatable and never touch the cruise lines' servers or the live database.
+
+DEFAULT_SIZES = (10, 100, 1000)
+SAIL_DATE = date.today() + timedelta(days=365)
+
+
+# === SYNTHETIC RESPONSES ===
+def po_response(tracker_obj, cruise_code, i):
+    cabins = tracker_obj.config.get("cabins", {})
+    return {"data": {
+        "sailingDate": SAIL_DATE.isoformat(),
+        "duration": 7,
+        "shipCode": next(iter(tracker_obj.config.get("ships", {})), "N/A"),
+        "departPortId": next(iter(tracker_obj.config.get("ports", {})), "N/A"),
+        "roomTypes": [
+            {"name": cabin, "categories": [{"id": category_id, "price": [
+                {"fare": "KU2", "price": {"parsedValue": 1000 + i % 100}},
+                {"fare": "KD1", "price": {"parsedValue": 1200 + i % 100},
+                 "onBoardCredits": {"amount": 50},
+                 "perks": [{"rateCode": "KD1", "onBoardCredit": {"parsedValue": 30}}]},
+                {"fare": "K8W", "price": {"parsedValue": 1700 + i % 100}},
+            ]}]}
+            for cabin, category_id in cabins.items()
+        ],
+    }}
+
+
+def princess_response(tracker_obj, cruise_code, i):
+    categories = [
+        {"id": category_id, "guests": [
+            {"id": 1, "fare": 900 + i % 100, "obc": 50},
+            {"id": 2, "fare": 900 + i % 100, "obc": 50},
+        ]}
+        for category_id in tracker_obj.config.get("cabins", {}).values()
+    ]
+    return {"products": [{"id": f"P{cruise_code}", "cruises": [{"pricing": {"fares": [
+        {"fareType": "BESTFARE", "categories": categories},
+        {"fareType": "BESTVALUE", "categories": categories},
+    ]}}]}]}
+
+
+def princess_metadata(tracker_obj, cruise_codes):
+    voyage = {
+        "ship": {"id": next(iter(tracker_obj.config.get("ships", {})), "N/A")},
+        "startPortId": next(iter(tracker_obj.config.get("ports", {})), "N/A"),
+        "sailDate": SAIL_DATE.strftime("%Y%m%d"),
+        "duration": 14,
+    }
+    return {"products": [
+        {"id": f"P{code}", "name": f"Benchmark {code}", "cruises": [{"id": code, "voyage": voyage}]}
+        for code in cruise_codes
+    ]}
+
+
+# Fares response builder for each line; a new line needs an entry here to be benchmarked
+RESPONSES = {
+    "po": po_response,
+    "princess": princess_response,
+}
+
+
+def write_fixtures(fixture_dir, tracker_obj, cruise_codes):
+    # Saves the exact request each cruise code would send, so replay finds it by key
+    build_response = RESPONSES[tracker_obj.line]
+    for i, code in enumerate(cruise_codes):
+        method, url, kwargs = tracker_obj.build_request(code)
+        prepared = requests.Request(method, url, **kwargs).prepare()
+        body = json.dumps(build_response(tracker_obj, code, i)).encode("utf-8")
+        fixtures.save_fixture(fixture_dir, method, prepared.url, prepared.body,
+                              200, {"Content-Type": "application/json"}, body)
+    if tracker_obj.line == "princess":
+        body = json.dumps(princess_metadata(tracker_obj, cruise_codes)).encode("utf-8")
+        fixtures.save_fixture(fixture_dir, "GET", tracker_obj.url_meta, None,
+                              200, {"Content-Type": "application/json"}, body)
+
+
+# === BENCHMARK ===
+def run_once(tracker_cls, size, fixture_dir, work_dir, server, settings):
+    cruise_codes = [f"B{i:05d}" for i in range(size)]
+    # Fresh metadata download every run; the tracker reads CACHE_DIR when it's built
+    fixtures.use_scratch_cache()
+    tracker_obj = tracker_cls(test_mode=True, db_path=Path(work_dir) / f"{tracker_cls.line}-{size}.db", full_run=True)
+    tracker_obj.cruise_codes = list(cruise_codes)
+    tracker_obj.settings.update(settings)
+    write_fixtures(fixture_dir, tracker_obj, cruise_codes)
+
+    requests_before = server.requests
+    stats = tracker_obj.run()
+    served = server.requests - requests_before
+    return {
+        **stats.as_dict(),
+        "codes": size,
+        "served": served,
+        "requests_per_second": round(served / stats.wall_time, 1) if stats.wall_time else 0.0,
+    }
+
+
+def print_results(results):
+    print("\n=== BENCHMARK ===")
+    print(f"{'Line':<10} {'Codes':>6} {'Wall (s)':>9} {'Req/s':>8} {'Fetch (s)':>10} "
+          f"{'Parse (s)':>10} {'Insert (s)':>11} {'Rows':>7} {'Failures':>9}")
+    for r in results:
+        print(
+            f"{r['line']:<10} {r['codes']:>6} {r['wall_time']:>9.2f} {r['requests_per_second']:>8.1f} "
+            f"{r['fetch_time']:>10.3f} {r['parse_time']:>10.3f} {r['insert_time']:>11.3f} "
+            f"{r['rows_inserted']:>7} {r['failures']:>9}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the trackers against a local stand-in server")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="numbers of cruise codes to run each tracker with")
+    parser.add_argument("--lines", nargs="+", help="cruise lines to benchmark, e.g. po princess (default: all)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random +/- seconds added to the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 503")
+    parser.add_argument("--max-in-flight", type=int, help="concurrent requests (default: each config's fetch setting)")
+    parser.add_argument("--rps", type=float, default=0,
+                        help="per-host request rate limit (default 0: unlimited)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the latency and error draws")
+    parser.add_argument("--json", metavar="PATH", help="also write the results to PATH as JSON")
+    args = parser.parse_args(argv)
+
+    settings = {"requests_per_second": args.rps}
+    if args.max_in_flight:
+        settings["max_in_flight"] = args.max_in_flight
+
+    trackers = [cls for cls in tracker.discover().values() if not args.lines or cls.line in args.lines]
+    results = []
+    with tempfile.TemporaryDirectory(prefix="cruise-bench-") as work_dir:
+        fixture_dir = Path(work_dir) / "fixtures"
+        server = fixtures.replay(fixture_dir, args.latency, args.jitter, args.error_rate, args.seed)
+        try:
+            for tracker_cls in trackers:
+                for size in args.sizes:
+                    print(f"\n▶ Benchmarking {tracker_cls.name} with {size} cruise codes...")
+                    results.append(run_once(tracker_cls, size, fixture_dir, work_dir, server, settings))
+        finally:
+            server.stop()
+
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f"📝 Results written to {args.json}")
+    return results
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import sys
+import json
+import mmap
+import struct
+import sqlite3
+import argparse
+from array import array
+from datetime import date
+from pathlib import Path
+from price_trackers import db
+from price_trackers.config_store import atomic_write
+
+try:
+    import numpy as np  # optional - Snapshot columns are memoryviews without it
+except ImportError:
+    np = None
+
+# Columnar snapshot of one line's price history, for analytics that would otherwise
+# SELECT * the row tables and build a dict per row:
+#     python -m price_trackers.columnar            # writes snapshots/<line>.cols for every line
+#
+# File layout: MAGIC, header length (uint64 LE), JSON header, then each column as a
+# packed little-endian array starting on a 64-byte boundary. Codes and names are
+# dictionary-encoded, dates are int day numbers (days since 1970-01-01) and prices
+# float64 with NaN for missing. Rows are sorted by series (sailing / cabin / fare) and
+# day, and series_start[i]:series_start[i + 1] is series i's slice of every row column,
+# so the file can be mmapped and used as NumPy arrays without copying or parsing.
+
+SNAPSHOT_DIR = Path(__file__).resolve().parents[1] / "snapshots"
+MAGIC = b"CRUISCOL"
+VERSION = 1
+ALIGN = 64
+EPOCH = date(1970, 1, 1).toordinal()
+# array typecode -> NumPy dtype
+DTYPES = {"i": "<i4", "d": "<f8"}
+SAILING_FIELDS = ("cruise_code", "cruise_name", "ship_name", "departure_port", "departure_date", "duration")
+
+
+def to_day(iso_date):
+    return date.fromisoformat(iso_date).toordinal() - EPOCH
+
+
+def from_day(day):
+    return date.fromordinal(int(day) + EPOCH).isoformat()
+
+
+def _align(n):
+    return -(-n // ALIGN) * ALIGN
+
+
+# === EXPORT ===
+def build_columns(conn, line):
+    # Reads one line's history in series order and returns (header fields, {name: array})
+    sailings = {}              # sailing id -> index in the sailing table
+    sailing_table = {field: [] for field in SAILING_FIELDS}
+    cabins, fares = {}, {}     # value -> dictionary code
+    rows = {"day_from": array("i"), "day_to": array("i")}
+    prices = {column: array("d") for column in db.PRICE_COLUMNS}
+    series = {"series_start": array("i"), "series_sailing": array("i"),
+              "series_cabin": array("i"), "series_fare": array("i")}
+
+    key = None
+    cursor = conn.execute(f"""
+        SELECT o.sailing_id, o.cabin_type, o.fare_type, o.date_checked, o.valid_to,
+               {', '.join('o.' + c for c in db.PRICE_COLUMNS)},
+               {', '.join('s.' + f for f in SAILING_FIELDS)}
+        FROM price_observations o
+        JOIN sailings s ON s.id = o.sailing_id
+        WHERE s.line = ?
+        ORDER BY o.sailing_id, o.cabin_type, o.fare_type, o.date_checked, o.id
+    """, (line,))
+    n_prices = len(db.PRICE_COLUMNS)
+    for row in cursor:
+        sailing_id, cabin, fare, date_checked, valid_to = row[:5]
+        if sailing_id not in sailings:
+            sailings[sailing_id] = len(sailings)
+            for field, value in zip(SAILING_FIELDS, row[5 + n_prices:]):
+                sailing_table[field].append(value)
+        if (sailing_id, cabin, fare) != key:
+            key = (sailing_id, cabin, fare)
+            series["series_start"].append(len(rows["day_from"]))
+            series["series_sailing"].append(sailings[sailing_id])
+            series["series_cabin"].append(cabins.setdefault(cabin, len(cabins)))
+            series["series_fare"].append(fares.setdefault(fare, len(fares)))
+        rows["day_from"].append(to_day(date_checked))
+        rows["day_to"].append(to_day(valid_to or date_checked))
+        for column, value in zip(db.PRICE_COLUMNS, row[5:5 + n_prices]):
+            prices[column].append(float("nan") if value is None else value)
+    series["series_start"].append(len(rows["day_from"]))
+
+    # Price columns this line never fills (e.g. obc for P&O) are left out
+    prices = {c: values for c, values in prices.items() if any(v == v for v in values)}
+    sailing_table["departure_day"] = [
+        to_day(d) if d and d[4:5] == "-" else None for d in sailing_table["departure_date"]
+    ]
+    header = {
+        "line": line,
+        "rows": len(rows["day_from"]),
+        "series": len(series["series_sailing"]),
+        "sailings": sailing_table,
+        "dictionaries": {"cabin_type": list(cabins), "fare_type": list(fares)},
+        "price_columns": list(prices),
+    }
+    return header, {**series, **rows, **prices}
+
+
+def write_snapshot(path, header, columns):
+    # Written to a temp file and renamed, so a reader that has the old file mapped keeps it
+    specs, offset = {}, 0
+    for name, values in columns.items():
+        specs[name] = {"dtype": DTYPES[values.typecode], "offset": offset, "count": len(values)}
+        offset = _align(offset + len(values) * values.itemsize)
+    header = {**header, "version": VERSION, "columns": specs}
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = _align(len(MAGIC) + 8 + len(header_bytes))
+
+    with atomic_write(path, 'wb') as f:
+        f.write(MAGIC + struct.pack("<Q", len(header_bytes)) + header_bytes)
+        for name, values in columns.items():
+            f.write(b"\0" * (data_start + specs[name]["offset"] - f.tell()))
+            if sys.byteorder != "little":
+                values = array(values.typecode, values)
+                values.byteswap()
+            values.tofile(f)
+    return header
+
+
+def export(conn, line, path=None):
+    path = path or SNAPSHOT_DIR / f"{line}.cols"
+    header, columns = build_columns(conn, line)
+    write_snapshot(path, header, columns)
+    return path, header
+
+
+# === LOAD ===
+class Snapshot:
+    # A snapshot file mapped read-only. columns[name] is a NumPy array (or a memoryview
+    # when NumPy isn't installed) backed directly by the mapping - nothing is copied.
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self.path} is not a cruise price snapshot")
+        (header_len,) = struct.unpack_from("<Q", self.buffer, len(MAGIC))
+        header_start = len(MAGIC) + 8
+        self.header = json.loads(self.buffer[header_start:header_start + header_len])
+        if self.header["version"] != VERSION:
+            raise ValueError(f"{self.path} is snapshot version {self.header['version']}, expected {VERSION}")
+        self.data_start = _align(header_start + header_len)
+        self.line = self.header["line"]
+        self.sailings = self.header["sailings"]
+        self.dictionaries = self.header["dictionaries"]
+        self.price_columns = self.header["price_columns"]
+        self.columns = {name: self._column(spec) for name, spec in self.header["columns"].items()}
+
+    def _column(self, spec):
+        start = self.data_start + spec["offset"]
+        if np is not None:
+            return np.frombuffer(self.buffer, dtype=spec["dtype"], count=spec["count"], offset=start)
+        typecode = next(t for t, dtype in DTYPES.items() if dtype == spec["dtype"])
+        size = spec["count"] * array(typecode).itemsize
+        return memoryview(self.buffer)[start:start + size].cast(typecode)
+
+    def __len__(self):
+        return self.header["rows"]
+
+    @property
+    def series_count(self):
+        return self.header["series"]
+
+    def series_key(self, i):
+        # (cruise_code, cabin_type, fare_type) of series i
+        return (
+            self.sailings["cruise_code"][self.columns["series_sailing"][i]],
+            self.dictionaries["cabin_type"][self.columns["series_cabin"][i]],
+            self.dictionaries["fare_type"][self.columns["series_fare"][i]],
+        )
+
+
+def load(line, snapshot_dir=SNAPSHOT_DIR):
+    return Snapshot(Path(snapshot_dir) / f"{line}.cols")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export each line's price history to a columnar snapshot")
+    parser.add_argument("--db", default=db.DB_PATH, help="database file to read")
+    parser.add_argument("--out", default=SNAPSHOT_DIR, help="directory for the <line>.cols files")
+    parser.add_argument("--lines", nargs="+", help="lines to export (default: every line in the database)")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True, timeout=db.BUSY_TIMEOUT)
+    lines = args.lines or [row[0] for row in conn.execute("SELECT DISTINCT line FROM sailings ORDER BY line")]
+    for line in lines:
+        path, header = export(conn, line, Path(args.out) / f"{line}.cols")
+        print(f"📦 {line}: {header['rows']} rows in {header['series']} series -> {path} "
+              f"({path.stat().st_size / 1024:.0f} KiB)")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
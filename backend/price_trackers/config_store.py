@@ -0,0 +1,122 @@
+import os
+import json
+import stat
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Config files and the removal log are shared by trackers running as threads and as
+# separate processes. Every change is made under a lock file, and only the change is
+# written: removals are appended to a JSON-lines journal, and config updates re-read
+# the file, apply just this run's removals and swap the result in with os.replace,
+# so a crash never leaves a half-written file and concurrent runs keep each other's edits.
+
+# flock only serialises separate open files, so threads of one process also share this
+_thread_lock = threading.RLock()
+
+# Read once at import: os.umask can only be read by setting it
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+@contextmanager
+def file_lock(path):
+    # Exclusive lock on <path>.lock, held for the block
+    with _thread_lock, open(f"{path}.lock", 'a+') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def atomic_write(path, mode='w', encoding=None):
+    # Yields a temp file next to path and renames it over path when the block ends, so
+    # readers see the old or the new file, never half of one. On an error the temp file
+    # is deleted and path is left untouched.
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # mkstemp creates the file 0600; keep the target's mode, or what open() would give it
+    try:
+        file_mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        file_mode = 0o666 & ~_UMASK
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, encoding=encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_name, file_mode)
+        os.replace(tmp_name, path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+
+def write_json_atomic(path, data):
+    with atomic_write(path) as f:
+        json.dump(data, f, indent=4)
+
+
+# === REMOVAL JOURNAL ===
+def migrate_removed(legacy_path, journal_path):
+    # One-off: turns the old removed_cruises.json array into the JSON-lines journal
+    legacy_path, journal_path = Path(legacy_path), Path(journal_path)
+    if journal_path.exists() or not legacy_path.exists():
+        return 0
+    with open(legacy_path, 'r') as f:
+        entries = json.load(f)
+    with atomic_write(journal_path) as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+    legacy_path.unlink()
+    print(f"📒 Moved {len(entries)} removals from {legacy_path.name} to {journal_path.name}")
+    return len(entries)
+
+
+def append_removed(journal_path, entries, legacy_path=None):
+    # Appends one JSON line per removal; existing entries are never read or rewritten
+    if not entries:
+        return
+    with file_lock(journal_path):
+        if legacy_path:
+            migrate_removed(legacy_path, journal_path)
+        with open(journal_path, 'a') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+# === CONFIG ===
+def remove_codes(config_path, codes):
+    # Drops codes from cruise_codes and routes in the file as it is now on disk
+    codes = set(codes)
+    if not codes:
+        return
+    with file_lock(config_path):
+        with open(config_path, 'r') as f:
+            config = json.load(f)
+        config["cruise_codes"] = [c for c in config.get("cruise_codes", []) if c not in codes]
+        routes = config.get("routes")
+        if routes is not None:
+            for code in codes:
+                routes.pop(code, None)
+        write_json_atomic(config_path, config)
@@ -0,0 +1,278 @@
+import os
+import sqlite3
+import threading
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(ROOT_DIR, "all_cruises.db")
+
+# Seconds a connection waits on a locked database before giving up
+BUSY_TIMEOUT = 60
+
+# WAL lets the web server keep reading while a tracker run is writing.
+# NORMAL is durable across application crashes and only fsyncs at checkpoints.
+JOURNAL_MODE = "WAL"
+SYNCHRONOUS = "NORMAL"
+
+# Rows buffered before each executemany; overridable with a "db" config section
+DEFAULT_BATCH_SIZE = 500
+
+# Trackers running as threads in one process share a single SQLite file,
+# so every write transaction is taken under this lock
+write_lock = threading.RLock()
+
+
+def connect(test_mode=False, path=None):
+    # path points at a scratch database instead of the live one (benchmarks)
+    if test_mode and path is None:
+        conn = sqlite3.connect(":memory:")  # In-memory DB for testing
+        print("⚙️ Using in-memory database (no data will persist)")
+        return conn
+    # timeout covers trackers running as separate processes
+    conn = sqlite3.connect(path or DB_PATH, timeout=BUSY_TIMEOUT)
+    conn.execute(f"PRAGMA journal_mode={JOURNAL_MODE}")
+    conn.execute(f"PRAGMA synchronous={SYNCHRONOUS}")
+    return conn
+
+
+def ensure_schema(conn):
+    # Brings the database up to the latest schema (see migrate.py)
+    from price_trackers import migrate
+    with write_lock:
+        applied = migrate.migrate(conn)
+    if applied:
+        print(f"🗄️ Migrated database schema to version {applied[-1]}")
+
+
+def db_settings(config):
+    settings = config.get("db", {})
+    return {
+        "batch_size": max(1, int(settings.get("batch_size", DEFAULT_BATCH_SIZE))),
+        "dedupe": bool(settings.get("dedupe", False)),
+    }
+
+
+# === RUN JOURNAL ===
+def start_run(conn, line, run_date):
+    # Picks up today's unfinished run for this line if there is one, else starts a new run.
+    # Returns (run_id, {cruise_code: (status, cruise_name, reason)} already journaled)
+    with write_lock:
+        row = conn.execute("""
+            SELECT id FROM runs WHERE line = ? AND run_date = ? AND finished_at IS NULL
+            ORDER BY id DESC LIMIT 1
+        """, (line, run_date)).fetchone()
+        if row:
+            run_id = row[0]
+        else:
+            run_id = conn.execute(
+                "INSERT INTO runs (line, run_date, started_at) VALUES (?, ?, datetime('now'))",
+                (line, run_date)
+            ).lastrowid
+            conn.commit()
+    return run_id, run_journal(conn, run_id)
+
+
+def run_journal(conn, run_id):
+    # {cruise_code: (status, cruise_name, reason)} journaled so far by a run
+    return {
+        code: (status, name, reason)
+        for code, status, name, reason in conn.execute(
+            "SELECT cruise_code, status, cruise_name, reason FROM run_journal WHERE run_id = ?", (run_id,)
+        )
+    }
+
+
+def checkpoint(conn, sink, run_id, entries):
+    # Commits the sink's rows and their run_journal entries in one transaction.
+    # entries: (cruise_code, status, cruise_name, reason) tuples
+    with write_lock:
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO run_journal (run_id, cruise_code, status, cruise_name, reason) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(run_id,) + tuple(entry) for entry in entries]
+            )
+        except BaseException:
+            sink.rollback()
+            raise
+        sink.commit()
+
+
+def finish_run(conn, run_id):
+    with write_lock:
+        conn.execute("UPDATE runs SET finished_at = datetime('now') WHERE id = ?", (run_id,))
+        conn.commit()
+
+
+_insert_sql = {}
+
+def insert_sql(table, columns):
+    # One SQL string per table, so sqlite3's statement cache prepares it only once
+    key = (table, tuple(columns))
+    if key not in _insert_sql:
+        _insert_sql[key] = (
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})"
+        )
+    return _insert_sql[key]
+
+
+class RowSink:
+    # Buffers rows for one table and writes them with executemany in chunks.
+    # Everything up to commit() is a single transaction, and write_lock is held
+    # from the first flush until then so concurrent trackers don't interleave.
+    def __init__(self, conn, table, columns, batch_size=DEFAULT_BATCH_SIZE):
+        self.conn = conn
+        self.sql = insert_sql(table, columns)
+        self.batch_size = batch_size
+        self.rows = []
+        self.written = 0
+        self._locked = False
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        self._lock()
+        self.conn.executemany(self.sql, self.rows)
+        self.written += len(self.rows)
+        self.rows = []
+
+    def _lock(self):
+        if not self._locked:
+            write_lock.acquire()
+            self._locked = True
+
+    def before_commit(self):
+        pass
+
+    def _release(self):
+        if self._locked:
+            self._locked = False
+            write_lock.release()
+
+    def commit(self):
+        try:
+            self.flush()
+            self.before_commit()
+            self.conn.commit()
+        except BaseException:
+            self.rollback()
+            raise
+        finally:
+            self._release()
+
+    def rollback(self):
+        self.rows = []
+        try:
+            self.conn.rollback()
+        finally:
+            self._release()
+
+
+OBSERVATION_COLUMNS = (
+    "sailing_id", "date_checked", "cabin_type", "fare_type", "cabin_price",
+    "fixed_obc", "bonus_obc", "obc", "total_price", "drinks_price", "valid_to", "revision",
+)
+PRICE_COLUMNS = OBSERVATION_COLUMNS[4:10]
+
+
+class ObservationSink(RowSink):
+    # RowSink for price_observations that also upserts the sailings they belong to
+    # and refreshes price_summary for everything it wrote before committing.
+    #
+    # Each row holds prices valid from date_checked to valid_to. With dedupe on, a fare
+    # whose prices match the last ones stored just has that row's valid_to moved on
+    # instead of getting a new row. Every insert/extension takes the next revision,
+    # which is what /cruises/<line>/changes pages on.
+    def __init__(self, conn, line, batch_size=DEFAULT_BATCH_SIZE, dedupe=False):
+        super().__init__(conn, "price_observations", OBSERVATION_COLUMNS, batch_size)
+        self.line = line
+        self.dedupe = dedupe
+        self.extended = []    # (valid_to, id) of rows to extend at the next flush
+        self.open_rows = {}   # (sailing_id, cabin, fare) -> [[id, valid_to, prices], ...]
+        self.extended_count = 0
+        self.start_revision = None
+        self.revision = None
+
+    def sailing(self, cruise_code, cruise_name, ship_name, departure_port, departure_date, duration):
+        # departure_date should be ISO (yyyy-mm-dd); returns the sailing id
+        from price_trackers.migrate import upsert_sailing
+        self._lock()
+        return upsert_sailing(
+            self.conn, self.line, cruise_code, cruise_name, ship_name,
+            departure_port, departure_date, duration
+        )
+
+    def add(self, sailing_id, date_checked, cabin_type, fare_type, cabin_price, total_price,
+            fixed_obc=None, bonus_obc=None, obc=None, drinks_price=None):
+        prices = (cabin_price, fixed_obc, bonus_obc, obc, total_price, drinks_price)
+        if self.dedupe and self._extend((sailing_id, cabin_type, fare_type), date_checked, prices):
+            return
+        super().add((sailing_id, date_checked, cabin_type, fare_type) + prices)
+
+    def _extend(self, key, date_checked, prices):
+        # Reuses the latest stored row for this fare if its prices are unchanged
+        if key not in self.open_rows:
+            self.open_rows[key] = [
+                [row[0], row[1], tuple(row[2:])]
+                for row in self.conn.execute(f"""
+                    SELECT id, valid_to, {', '.join(PRICE_COLUMNS)} FROM price_observations
+                    WHERE sailing_id = ? AND cabin_type = ? AND fare_type = ?
+                      AND valid_to = (SELECT MAX(valid_to) FROM price_observations
+                                      WHERE sailing_id = ? AND cabin_type = ? AND fare_type = ?)
+                """, key + key)
+            ]
+        for row in self.open_rows[key]:
+            if row[1] < date_checked and row[2] == prices:
+                row[1] = date_checked  # one extension per stored row and day
+                self.extended.append((date_checked, row[0]))
+                if len(self.extended) >= self.batch_size:
+                    self.flush()
+                return True
+        return False
+
+    def _next_revisions(self, count):
+        if self.revision is None:
+            self.revision = self.conn.execute(
+                "SELECT COALESCE(MAX(revision), 0) FROM price_observations"
+            ).fetchone()[0]
+            self.start_revision = self.revision
+        first = self.revision + 1
+        self.revision += count
+        return range(first, first + count)
+
+    def flush(self):
+        if not self.rows and not self.extended:
+            return
+        self._lock()
+        if self.extended:
+            self.conn.executemany(
+                "UPDATE price_observations SET valid_to = ?, revision = ? WHERE id = ?",
+                [(valid_to, revision, row_id) for (valid_to, row_id), revision
+                 in zip(self.extended, self._next_revisions(len(self.extended)))]
+            )
+            self.extended_count += len(self.extended)
+            self.extended = []
+        # Rows are complete once they get their valid_to (= date_checked) and revision
+        self.rows = [
+            row + (row[1], revision)
+            for row, revision in zip(self.rows, self._next_revisions(len(self.rows)))
+        ]
+        super().flush()
+
+    def rollback(self):
+        # Forget everything not yet committed, including the cached open rows
+        self.extended = []
+        self.open_rows = {}
+        self.start_revision = self.revision = None
+        super().rollback()
+
+    def before_commit(self):
+        from price_trackers.migrate import refresh_summary
+        if self.start_revision is not None:
+            refresh_summary(self.conn, self.start_revision)
+            self.start_revision = self.revision = None
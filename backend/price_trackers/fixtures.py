@@ -0,0 +1,178 @@
+import json
+import gzip
+import time
+import random
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from functools import partial
+from urllib.parse import quote, unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from requests.adapters import HTTPAdapter
+from price_trackers import http_client, http_cache
+
+# Record real responses to compressed fixture files, then replay them offline through
+# a local stand-in server with configurable latency and error rate:
+#     python -m price_trackers.master --record fixtures/
+#     python -m price_trackers.master --test --replay fixtures/ --latency 0.2 --error-rate 0.05
+#
+# Each request is stored as <fixture_dir>/<key>.json.gz, keyed on method, URL and body.
+
+FIXTURE_DIR = Path(__file__).resolve().parents[1] / "fixtures"
+# Headers worth keeping; the body is stored decoded, so Content-Encoding is dropped
+KEEP_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Retry-After")
+
+
+def fixture_key(method, url, body=None):
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    digest = hashlib.sha256(f"{method.upper()} {url}\n".encode("utf-8") + (body or b""))
+    return digest.hexdigest()[:32]
+
+
+def save_fixture(fixture_dir, method, url, body, status, headers, content):
+    fixture_dir = Path(fixture_dir)
+    fixture_dir.mkdir(parents=True, exist_ok=True)
+    fixture = {
+        "method": method.upper(),
+        "url": url,
+        "status": status,
+        "headers": {h: headers[h] for h in KEEP_HEADERS if h in headers},
+        "body": content.decode("utf-8"),
+    }
+    with gzip.open(fixture_dir / f"{fixture_key(method, url, body)}.json.gz", 'wt', encoding='utf-8') as f:
+        json.dump(fixture, f)
+
+
+def load_fixture(fixture_dir, method, url, body=None):
+    try:
+        with gzip.open(Path(fixture_dir) / f"{fixture_key(method, url, body)}.json.gz", 'rt', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def use_scratch_cache():
+    # Record/replay the Princess metadata request instead of reading backend/cache
+    http_cache.CACHE_DIR = Path(tempfile.mkdtemp(prefix="cruise-cache-"))
+
+
+# === RECORD ===
+class RecordingAdapter(HTTPAdapter):
+    def __init__(self, fixture_dir, **kwargs):
+        self.fixture_dir = fixture_dir
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        # .content reads the whole body; later iter_content() calls replay it from memory
+        save_fixture(
+            self.fixture_dir, request.method, request.url, request.body,
+            response.status_code, response.headers, response.content,
+        )
+        return response
+
+
+def record(fixture_dir=FIXTURE_DIR):
+    use_scratch_cache()
+    http_client.adapter_factory = partial(RecordingAdapter, fixture_dir)
+    print(f"⏺️ Recording responses to {fixture_dir}")
+
+
+# === REPLAY ===
+class StandInServer:
+    # Local HTTP server answering with recorded fixtures. Each request waits
+    # latency +/- jitter seconds and fails with a 503 at error_rate.
+    def __init__(self, fixture_dir=FIXTURE_DIR, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        self.fixture_dir = fixture_dir
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def _draw(self):
+        with self.lock:
+            self.requests += 1
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+            fail = self.random.random() < self.error_rate
+        return delay, fail
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                self.respond()
+
+            def do_POST(self):
+                self.respond()
+
+            def respond(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                url = unquote(self.path[1:])  # /<quoted original url>
+                delay, fail = server._draw()
+                time.sleep(delay)
+                fixture = None if fail else load_fixture(server.fixture_dir, self.command, url, body or None)
+                if fail:
+                    status, headers, content = 503, {"Retry-After": "0"}, b"stand-in error"
+                elif fixture is None:
+                    status, headers, content = 404, {}, f"no fixture for {self.command} {url}".encode()
+                else:
+                    status, headers, content = fixture["status"], fixture["headers"], fixture["body"].encode("utf-8")
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass  # keep run output readable
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class ReplayAdapter(HTTPAdapter):
+    # Sends every request to the stand-in server, with the original URL as the path
+    def __init__(self, base_url, **kwargs):
+        self.base_url = base_url
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        request = request.copy()
+        request.url = f"{self.base_url}/{quote(request.url, safe='')}"
+        for header in ("If-None-Match", "If-Modified-Since"):
+            request.headers.pop(header, None)
+        return super().send(request, **kwargs)
+
+
+def replay(fixture_dir=FIXTURE_DIR, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+    # Starts the stand-in server and points every new session at it; returns the server
+    use_scratch_cache()
+    server = StandInServer(fixture_dir, latency, jitter, error_rate, seed).start()
+    http_client.adapter_factory = partial(ReplayAdapter, server.base_url)
+    print(f"⏯️ Replaying {fixture_dir} from {server.base_url} "
+          f"(latency {latency}s, error rate {error_rate:.0%})")
+    return server
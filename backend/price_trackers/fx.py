@@ -0,0 +1,135 @@
+import requests
+from datetime import date
+from price_trackers import db
+
+# Daily exchange rates for converting fares, e.g. Princess on-board credit quoted in USD.
+# A rate is looked up once per (pair, day): memo -> fx_rates table -> provider (stored in
+# fx_rates) -> most recent stored rate -> DEFAULT_RATES, so a run makes at most one
+# request per pair and converting a fare never touches the network.
+
+# Offline fallback when no rate was ever stored for a pair
+DEFAULT_RATES = {
+    ("USD", "GBP"): 0.78,
+}
+DEFAULT_TIMEOUT = 10  # seconds
+RATES_API_URL = "https://theratesapi.com/api/{day}"
+
+
+class RatesApiProvider:
+    # Live daily rates from theratesapi.com (the API forex-python wraps). It has its own
+    # plain session, so none of a cruise line's headers, API keys or cookies reach it,
+    # and a timeout, so an unresponsive API falls back to the stored rates.
+    name = "theratesapi"
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        self.session = requests.Session()
+        self.timeout = timeout
+
+    def rate(self, base, quote, day):
+        response = self.session.get(
+            RATES_API_URL.format(day=day.isoformat()),
+            params={"base": base, "symbols": quote},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        rate = response.json().get("rates", {}).get(quote)
+        if not rate:
+            raise LookupError(f"{base}/{quote} not in the response for {day}")
+        return float(rate)
+
+
+class StubProvider:
+    # Fixed rates, no network; used in test mode
+    name = "stub"
+
+    def __init__(self, rates=None, timeout=None):  # no requests, so no timeout
+        self.rates = dict(DEFAULT_RATES if rates is None else rates)
+
+    def rate(self, base, quote, day):
+        return self.rates[(base, quote)]
+
+
+PROVIDERS = {
+    RatesApiProvider.name: RatesApiProvider,
+    "forex-python": RatesApiProvider,  # older configs; same API
+    StubProvider.name: StubProvider,
+}
+
+
+def make_provider(config, test_mode=False, timeout=DEFAULT_TIMEOUT):
+    # "fx": {"provider": "theratesapi"} in a tracker's config; test mode always uses the stub.
+    # Live requests give up after timeout seconds.
+    name = StubProvider.name if test_mode else config.get("fx", {}).get("provider", RatesApiProvider.name)
+    try:
+        return PROVIDERS[name](timeout=timeout)
+    except (KeyError, RuntimeError) as e:
+        print(f"⚠️ FX provider {name!r} unavailable ({e}) - using stored / default rates")
+        return None
+
+
+class CurrencyService:
+    def __init__(self, conn, provider=None, fallback=DEFAULT_RATES):
+        self.conn = conn
+        self.provider = provider
+        self.fallback = fallback
+        self.memo = {}  # (base, quote, iso day) -> rate
+
+    def rate(self, base, quote, day=None):
+        day = (day or date.today()).isoformat()
+        key = (base, quote, day)
+        if base == quote:
+            return 1.0
+        if key not in self.memo:
+            self.memo[key] = self._lookup(base, quote, day)
+        return self.memo[key]
+
+    def _lookup(self, base, quote, day):
+        row = self.conn.execute(
+            "SELECT rate FROM fx_rates WHERE base = ? AND quote = ? AND rate_date = ?", (base, quote, day)
+        ).fetchone()
+        if row:
+            return row[0]
+
+        if self.provider is not None:
+            try:
+                rate = self.provider.rate(base, quote, date.fromisoformat(day))
+            except Exception as e:
+                print(f"⚠️ Could not fetch {base}/{quote} rate for {day}: {e}")
+            else:
+                self._store(base, quote, day, rate)
+                print(f"💱 {base}/{quote} on {day}: {rate} ({self.provider.name})")
+                return rate
+
+        # -- Offline: the latest stored rate before the day, else the built-in default --
+        row = self.conn.execute("""
+            SELECT rate, rate_date FROM fx_rates WHERE base = ? AND quote = ? AND rate_date < ?
+            ORDER BY rate_date DESC LIMIT 1
+        """, (base, quote, day)).fetchone()
+        if row:
+            print(f"💱 Using {base}/{quote} rate from {row[1]}: {row[0]}")
+            return row[0]
+        if (base, quote) in self.fallback:
+            print(f"💱 Using default {base}/{quote} rate: {self.fallback[(base, quote)]}")
+            return self.fallback[(base, quote)]
+        raise LookupError(f"No {base}/{quote} rate for {day}")
+
+    def _store(self, base, quote, day, rate):
+        source = self.provider.name
+        with db.write_lock:
+            # Inside a tracker's open chunk the row is committed along with it
+            commit = not self.conn.in_transaction
+            self.conn.execute("""
+                INSERT OR REPLACE INTO fx_rates (base, quote, rate_date, rate, source, fetched_at)
+                VALUES (?, ?, ?, ?, ?, datetime('now'))
+            """, (base, quote, day, rate, source))
+            if commit:
+                self.conn.commit()
+
+    def convert_batch(self, records, fields, base, quote, day=None, digits=2):
+        # Converts `fields` of every record (dicts) in place with one rate lookup
+        rate = self.rate(base, quote, day)
+        for record in records:
+            for field in fields:
+                if record.get(field):
+                    record[field] = round(record[field] * rate, digits)
+        return records
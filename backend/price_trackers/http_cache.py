@@ -0,0 +1,87 @@
+import gzip
+import json
+import time
+import hashlib
+from pathlib import Path
+from price_trackers.config_store import atomic_write, write_json_atomic
+
+# === DEFAULTS ===
+# Overridable with a "metadata_cache" section in the cruise line config.
+# ttl_hours of 0 revalidates with the server on every run.
+# stream loads the cached body one array item at a time (see json_stream.py).
+CACHE_DIR = Path(__file__).resolve().parents[1] / "cache"
+DEFAULT_TTL_HOURS = 20
+CHUNK_SIZE = 64 * 1024
+
+
+def cache_settings(config):
+    cache = config.get("metadata_cache", {})
+    return {
+        "ttl": float(cache.get("ttl_hours", DEFAULT_TTL_HOURS)) * 3600,
+        "cache_dir": Path(cache.get("dir", CACHE_DIR)),
+        "stream": bool(cache.get("stream", False)),
+    }
+
+
+def _paths(cache_dir, url):
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+    return cache_dir / f"{key}.json.gz", cache_dir / f"{key}.meta.json"
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def fetch_cached(session, url, cache_dir=CACHE_DIR, ttl=DEFAULT_TTL_HOURS * 3600, timeout=50):
+    # Returns (path to a gzip-compressed copy of the body, source) where source is
+    # "cache", "revalidated", "downloaded" or "stale" - or (None, "failed").
+    # The body is streamed straight to disk, so it is never held in memory here.
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    body_path, meta_path = _paths(cache_dir, url)
+
+    meta = _read_meta(meta_path) if body_path.exists() else None
+    if meta and time.time() - meta.get("fetched_at", 0) < ttl:
+        return body_path, "cache"
+
+    # -- Conditional request when we have validators from last time --
+    headers = {}
+    if meta and meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta and meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    try:
+        with session.get(url, headers=headers, timeout=timeout, stream=True) as response:
+            if response.status_code == 304 and meta:
+                meta["fetched_at"] = time.time()
+                write_json_atomic(meta_path, meta)
+                return body_path, "revalidated"
+            response.raise_for_status()
+
+            with atomic_write(body_path, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as gz:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    gz.write(chunk)
+
+            write_json_atomic(meta_path, {
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "fetched_at": time.time(),
+            })
+            return body_path, "downloaded"
+    except Exception as e:
+        if body_path.exists():
+            print(f"⚠️ Fetch failed for {url} ({e}) - using cached copy")
+            return body_path, "stale"
+        print(f"❌ Fetch failed for {url} ({e}) and nothing is cached")
+        return None, "failed"
+
+
+def load_json(body_path):
+    with gzip.open(body_path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
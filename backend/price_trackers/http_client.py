@@ -0,0 +1,212 @@
+import time
+import random
+import asyncio
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+
+# === DEFAULTS ===
+# Can be overridden per cruise line with a "fetch" section in its config file
+DEFAULT_MAX_IN_FLIGHT = 8
+DEFAULT_REQUESTS_PER_SECOND = 4.0
+DEFAULT_TIMEOUT = 50
+DEFAULT_RETRIES = 3              # extra attempts for a request that fails with a transient error
+DEFAULT_BACKOFF = 1.0            # seconds; attempt n waits a random time up to backoff * 2**n
+DEFAULT_BACKOFF_MAX = 30.0
+DEFAULT_BREAKER_THRESHOLD = 5    # consecutive failures before a host's circuit opens
+DEFAULT_BREAKER_COOLDOWN = 60.0  # seconds requests to an open host fail straight away
+
+# Worth another attempt: rate limiting and server-side trouble
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+def fetch_settings(config):
+    fetch = config.get("fetch", {})
+    return {
+        "max_in_flight": max(1, int(fetch.get("max_in_flight", DEFAULT_MAX_IN_FLIGHT))),
+        "requests_per_second": float(fetch.get("requests_per_second", DEFAULT_REQUESTS_PER_SECOND)),
+        "timeout": fetch.get("timeout", DEFAULT_TIMEOUT),
+        "retries": max(0, int(fetch.get("retries", DEFAULT_RETRIES))),
+        "backoff": float(fetch.get("backoff", DEFAULT_BACKOFF)),
+        "backoff_max": float(fetch.get("backoff_max", DEFAULT_BACKOFF_MAX)),
+        "breaker_threshold": max(1, int(fetch.get("breaker_threshold", DEFAULT_BREAKER_THRESHOLD))),
+        "breaker_cooldown": float(fetch.get("breaker_cooldown", DEFAULT_BREAKER_COOLDOWN)),
+    }
+
+
+# Transport for new sessions; fixtures.py swaps it to record or replay responses
+adapter_factory = HTTPAdapter
+
+
+def make_session(headers, cookies, pool_size=DEFAULT_MAX_IN_FLIGHT):
+    # One pooled keep-alive session shared by every request of a run
+    session = requests.Session()
+    adapter = adapter_factory(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(headers)
+    session.cookies.update(cookies)
+    return session
+
+
+class HostRateLimiter:
+    # Spaces out request starts so each host sees at most `rate` requests per second
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, url):
+        # Returns how long the caller must wait before sending a request to url's host
+        if not self.interval:
+            return 0.0
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        return slot - now
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    # Per host: after `threshold` failures in a row, requests to that host fail fast
+    # for `cooldown` seconds instead of queueing up behind timeouts. After the cooldown
+    # requests go through again; one more failure re-opens the circuit straight away.
+    def __init__(self, threshold=DEFAULT_BREAKER_THRESHOLD, cooldown=DEFAULT_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = {}
+        self._open_until = {}
+        self._lock = threading.Lock()
+
+    def check(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if time.monotonic() < self._open_until.get(host, 0.0):
+                raise CircuitOpenError(f"circuit open for {host}")
+
+    def record(self, url, ok):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if ok:
+                self._failures[host] = 0
+                return
+            self._failures[host] = self._failures.get(host, 0) + 1
+            if self._failures[host] >= self.threshold:
+                if time.monotonic() >= self._open_until.get(host, 0.0):
+                    print(f"⚡ {host} failed {self._failures[host]} times in a row - pausing for {self.cooldown:.0f}s")
+                self._open_until[host] = time.monotonic() + self.cooldown
+
+
+def is_retryable(error):
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code in RETRY_STATUSES
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+def backoff_delay(attempt, backoff, backoff_max, error=None):
+    # "Full jitter": a random wait up to the exponential cap, so retries from many
+    # requests don't arrive in lockstep. A Retry-After header (in seconds) wins.
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            return min(backoff_max, float(response.headers.get("Retry-After")))
+        except (TypeError, ValueError):
+            pass
+    return random.uniform(0, min(backoff_max, backoff * 2 ** attempt))
+
+
+class FetchResult:
+    def __init__(self, key, response=None, error=None, elapsed=0.0, attempts=1, latencies=None):
+        self.key = key
+        self.response = response
+        self.error = error
+        self.elapsed = elapsed
+        self.attempts = attempts
+        self.latencies = latencies or []  # seconds on the wire for each attempt
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+async def _fetch_one(loop, executor, semaphore, limiter, breaker, session, job, timeout,
+                     retries, backoff, backoff_max):
+    key, method, url, kwargs = job
+    start = time.perf_counter()
+    latencies = []
+
+    def send():
+        response = session.request(method, url, timeout=timeout, **kwargs)
+        response.raise_for_status()
+        return response
+
+    for attempt in range(retries + 1):
+        try:
+            breaker.check(url)
+        except CircuitOpenError as e:
+            return FetchResult(key, error=e, elapsed=time.perf_counter() - start, attempts=attempt,
+                               latencies=latencies)
+
+        # Only the request itself holds a slot; backoff sleeps don't
+        async with semaphore:
+            delay = limiter.reserve(url)
+            if delay:
+                await asyncio.sleep(delay)
+            sent = time.perf_counter()
+            try:
+                response = await loop.run_in_executor(executor, send)
+            except Exception as e:
+                error = e
+            else:
+                breaker.record(url, ok=True)
+                latencies.append(time.perf_counter() - sent)
+                return FetchResult(key, response=response, elapsed=time.perf_counter() - start,
+                                   attempts=attempt + 1, latencies=latencies)
+            latencies.append(time.perf_counter() - sent)
+
+        breaker.record(url, ok=False)
+        if attempt == retries or not is_retryable(error):
+            break
+        await asyncio.sleep(backoff_delay(attempt, backoff, backoff_max, error))
+    return FetchResult(key, error=error, elapsed=time.perf_counter() - start, attempts=attempt + 1,
+                       latencies=latencies)
+
+
+async def _fetch_all(session, jobs, max_in_flight, requests_per_second, timeout,
+                     retries, backoff, backoff_max, breaker):
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_in_flight)
+    limiter = HostRateLimiter(requests_per_second)
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        tasks = [
+            _fetch_one(loop, executor, semaphore, limiter, breaker, session, job, timeout,
+                       retries, backoff, backoff_max)
+            for job in jobs
+        ]
+        # gather keeps results in job order, so parsing stays deterministic
+        return await asyncio.gather(*tasks)
+
+
+def fetch_all(session, jobs, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+              requests_per_second=DEFAULT_REQUESTS_PER_SECOND, timeout=DEFAULT_TIMEOUT,
+              retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, backoff_max=DEFAULT_BACKOFF_MAX,
+              breaker_threshold=DEFAULT_BREAKER_THRESHOLD, breaker_cooldown=DEFAULT_BREAKER_COOLDOWN,
+              breaker=None):
+    # jobs: list of (key, method, url, requests kwargs) tuples
+    # Returns one FetchResult per job, in the same order as jobs.
+    # Pass the same breaker to several calls to keep a host's failure count between them.
+    if not jobs:
+        return []
+    if breaker is None:
+        breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+    return asyncio.run(_fetch_all(
+        session, jobs, max_in_flight, requests_per_second, timeout,
+        retries, backoff, backoff_max, breaker,
+    ))
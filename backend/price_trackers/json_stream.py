@@ -0,0 +1,84 @@
+import json
+
+# Incremental reader for large JSON documents of the form {"key": [item, item, ...], ...}.
+# Only one array item is decoded and held in memory at a time.
+
+CHUNK_SIZE = 64 * 1024
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = _WHITESPACE + ",]}"
+
+
+class _Reader:
+    def __init__(self, fp, chunk_size):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        # Drop what has been consumed, then append the next chunk
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        # Next non-whitespace character, or "" at end of input
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"Expected one of {chars!r} at offset {self.pos}, got {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        # Decode one complete JSON value, reading more input until it is whole
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            # A value cut off at the buffer edge (e.g. "6" of "6.5") may continue
+            if (end == len(self.buf) or self.buf[end] not in _DELIMITERS) and self.fill():
+                continue
+            self.pos = end
+            return obj
+
+
+def iter_array(fp, key, chunk_size=CHUNK_SIZE):
+    # Yields the items of the top-level array stored under `key` in a text file object.
+    # Other top-level values are decoded and discarded one at a time.
+    reader = _Reader(fp, chunk_size)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        name = reader.value()
+        reader.expect(":")
+        if name == key and reader.peek() == "[":
+            reader.expect("[")
+            if reader.peek() == "]":
+                return
+            while True:
+                yield reader.value()
+                if reader.expect(",]") == "]":
+                    return
+        reader.value()
+        if reader.expect(",}") == "}":
+            return
@@ -1,13 +1,92 @@
-from price_trackers import po_price_tracker as po_tracker
-from price_trackers import princess_price_tracker as princess_tracker
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from price_trackers import tracker, fixtures, metrics
+from price_trackers.metrics import RunStats
 
-def main():
-    print("\n▶ Running P&O tracker...")
-    po_tracker.main()
-    
-    print("▶ Running Princess tracker...")
-    princess_tracker.main()
+# === REGISTERED TRACKERS ===
+# Every price_trackers/*_price_tracker.py registers its Tracker subclass
+TRACKERS = tracker.discover()
 
+def run_tracker(line, tracker_cls, test_mode=False, full_run=False):
+    print(f"\n▶ Running {line} tracker...")
+    try:
+        return tracker_cls(test_mode=test_mode, full_run=full_run).run()
+    except Exception as e:
+        print(f"❌ {line} tracker failed: {e}")
+        stats = RunStats(line)
+        stats.failures += 1
+        stats.crashed = True
+        return stats.finish()
+
+def print_summary(all_stats, wall_time):
+    print("\n=== RUN SUMMARY ===")
+    print(f"{'Line':<10} {'Wall (s)':>9} {'Requests':>9} {'Rows':>7} {'Extended':>9} {'Failures':>9} {'Removed':>8}")
+    for stats in all_stats:
+        print(
+            f"{stats.line:<10} {stats.wall_time:>9.2f} {stats.requests:>9} "
+            f"{stats.rows_inserted:>7} {stats.rows_extended:>9} {stats.failures:>9} {stats.removed:>8}"
+        )
+    print(f"Total wall time: {wall_time:.2f}s")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run every registered cruise-line tracker")
+    parser.add_argument("--sequential", action="store_true",
+                        help="run trackers one after another instead of concurrently")
+    parser.add_argument("--full", action="store_true",
+                        help="fetch every tracked cruise, ignoring each line's schedule")
+    parser.add_argument("--profile", action="store_true",
+                        help="print per-stage timings, errors and request latency at the end")
+    parser.add_argument("--metrics", metavar="PATH", default=metrics.METRICS_PATH,
+                        help="JSON-lines file each run's metrics are appended to")
+    parser.add_argument("--prometheus", metavar="PATH",
+                        help="also write the metrics to PATH in Prometheus text format")
+    parser.add_argument("--test", action="store_true",
+                        help="use an in-memory database and leave the config files untouched")
+    parser.add_argument("--record", metavar="DIR",
+                        help="save every response to compressed fixtures in DIR")
+    parser.add_argument("--replay", metavar="DIR",
+                        help="serve responses from the fixtures in DIR instead of the live APIs")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds the replay server waits before each response")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="random +/- seconds added to the replay latency")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="fraction of replayed requests answered with a 503")
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.record:
+        fixtures.record(args.record)
+    elif args.replay:
+        server = fixtures.replay(args.replay, args.latency, args.jitter, args.error_rate)
+
+    start = time.perf_counter()
+    if args.sequential:
+        all_stats = [run_tracker(line, cls, args.test, args.full) for line, cls in TRACKERS.items()]
+    else:
+        # Each line hits its own host, so run them side by side
+        with ThreadPoolExecutor(max_workers=len(TRACKERS)) as executor:
+            futures = [executor.submit(run_tracker, line, cls, args.test, args.full)
+                       for line, cls in TRACKERS.items()]
+            all_stats = [f.result() for f in futures]
+
+    if server:
+        server.stop()
+    print_summary(all_stats, time.perf_counter() - start)
+    if args.profile:
+        metrics.print_profile(all_stats)
+    metrics.write_jsonl(all_stats, args.metrics)
+    if args.prometheus:
+        metrics.write_prometheus(all_stats, args.prometheus)
+
+    crashed = [stats.line for stats in all_stats if stats.crashed]
+    if crashed:
+        # Only once every tracker is done and the DB holds what they stored: the workflow
+        # still commits that, then the non-zero exit marks the run as failed
+        print(f"\n❌ Tracker(s) failed: {', '.join(crashed)}")
+        sys.exit(1)
     print("\n✅ All trackers finished!")
 
 if __name__ == "__main__":
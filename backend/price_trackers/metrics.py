@@ -0,0 +1,191 @@
+import json
+import time
+import bisect
+from datetime import datetime
+from contextlib import contextmanager
+from pathlib import Path
+from price_trackers.config_store import atomic_write
+
+# Stages of a tracker run, in order; each gets a timer and an error count
+STAGES = ("fetch", "decode", "parse", "insert")
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRICS_DIR = Path(__file__).resolve().parents[1] / "logs"
+METRICS_PATH = METRICS_DIR / "tracker_metrics.jsonl"
+
+
+class Histogram:
+    # Fixed-bucket histogram, Prometheus style: counts[i] holds observations <= buckets[i],
+    # and the last slot everything above the largest bucket
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation (max for the overflow bucket)
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def cumulative(self):
+        # (le, observations <= le) pairs, ending with "+Inf"
+        total = 0
+        pairs = []
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "max": round(self.max, 3),
+            "p50": round(self.quantile(0.5), 3),
+            "p95": round(self.quantile(0.95), 3),
+            "buckets": {str(le): n for le, n in self.cumulative()},
+        }
+
+
+class RunStats:
+    # Counters for one cruise line's run, reported by master.py at the end
+    def __init__(self, line):
+        self.line = line
+        self.requests = 0
+        self.rows_inserted = 0
+        self.rows_extended = 0  # unchanged prices stored by extending an existing row
+        self.failures = 0
+        self.removed = 0
+        self.crashed = False  # the tracker raised instead of finishing its run
+        self.wall_time = 0.0
+        self.bytes_received = 0
+        self.latency = Histogram()  # per HTTP request, each retry counted separately
+        # Seconds spent in and errors raised by each stage of the run
+        self.stage_times = dict.fromkeys(STAGES, 0.0)
+        self.stage_errors = dict.fromkeys(STAGES, 0)
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def timed(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_times[stage] += time.perf_counter() - start
+
+    def error(self, stage):
+        self.failures += 1
+        self.stage_errors[stage] += 1
+
+    def request(self, latency):
+        self.latency.observe(latency)
+
+    def finish(self):
+        self.wall_time = time.perf_counter() - self._start
+        return self
+
+    def as_dict(self):
+        stats = {
+            "line": self.line,
+            "wall_time": round(self.wall_time, 2),
+            "requests": self.requests,
+            "rows_inserted": self.rows_inserted,
+            "rows_extended": self.rows_extended,
+            "failures": self.failures,
+            "removed": self.removed,
+            "bytes_received": self.bytes_received,
+        }
+        for stage in STAGES:
+            stats[f"{stage}_time"] = round(self.stage_times[stage], 3)
+        for stage in STAGES:
+            stats[f"{stage}_errors"] = self.stage_errors[stage]
+        stats["latency"] = self.latency.as_dict()
+        return stats
+
+
+# === OUTPUT ===
+def write_jsonl(all_stats, path=METRICS_PATH):
+    # Appends one JSON object per cruise line, so runs can be compared over time
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now().isoformat(timespec="seconds")
+    with open(path, 'a', encoding='utf-8') as f:
+        for stats in all_stats:
+            f.write(json.dumps({"timestamp": timestamp, **stats.as_dict()}) + "\n")
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def prometheus_text(all_stats):
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP cruise_tracker_{name} {help_text}")
+        lines.append(f"# TYPE cruise_tracker_{name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{k}="{_label(v)}"' for k, v in labels.items())
+            lines.append(f"cruise_tracker_{name}{{{label_text}}} {value}")
+
+    metric("wall_seconds", "gauge", "Duration of the last run.",
+           [({"line": s.line}, round(s.wall_time, 3)) for s in all_stats])
+    for name, attr, help_text in (
+        ("requests", "requests", "HTTP requests sent, including retries."),
+        ("bytes_received", "bytes_received", "Response bytes received."),
+        ("rows_inserted", "rows_inserted", "Price rows inserted."),
+        ("rows_extended", "rows_extended", "Price rows extended instead of inserted."),
+        ("removed", "removed", "Cruises removed from tracking."),
+    ):
+        metric(name, "gauge", help_text, [({"line": s.line}, getattr(s, attr)) for s in all_stats])
+    metric("stage_seconds", "gauge", "Seconds spent in each stage of the last run.",
+           [({"line": s.line, "stage": stage}, round(s.stage_times[stage], 3))
+            for s in all_stats for stage in STAGES])
+    metric("stage_errors", "gauge", "Errors in each stage of the last run.",
+           [({"line": s.line, "stage": stage}, s.stage_errors[stage])
+            for s in all_stats for stage in STAGES])
+
+    lines.append("# HELP cruise_tracker_request_seconds Request latency of the last run.")
+    lines.append("# TYPE cruise_tracker_request_seconds histogram")
+    for s in all_stats:
+        line = _label(s.line)
+        for le, count in s.latency.cumulative():
+            lines.append(f'cruise_tracker_request_seconds_bucket{{line="{line}",le="{le}"}} {count}')
+        lines.append(f'cruise_tracker_request_seconds_sum{{line="{line}"}} {round(s.latency.sum, 3)}')
+        lines.append(f'cruise_tracker_request_seconds_count{{line="{line}"}} {s.latency.count}')
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(all_stats, path):
+    # Written to a temp file and renamed, so the node_exporter textfile collector
+    # never reads a half-written file
+    with atomic_write(path, encoding='utf-8') as f:
+        f.write(prometheus_text(all_stats))
+
+
+def print_profile(all_stats):
+    print("\n=== PROFILE ===")
+    for s in all_stats:
+        wall = s.wall_time or 1.0
+        print(f"{s.line}: {s.requests} requests, {s.bytes_received / 1024:.0f} KiB received")
+        for stage in STAGES:
+            print(f"  {stage:<8} {s.stage_times[stage]:>8.3f}s {s.stage_times[stage] / wall:>6.1%}"
+                  f"  {s.stage_errors[stage]:>4} errors")
+        print(f"  latency  p50 {s.latency.quantile(0.5):.3f}s  p95 {s.latency.quantile(0.95):.3f}s"
+              f"  p99 {s.latency.quantile(0.99):.3f}s  max {s.latency.max:.3f}s")
@@ -0,0 +1,470 @@
+import argparse
+import sqlite3
+from datetime import datetime
+from price_trackers import db
+
+# Schema migrations for all_cruises.db, tracked with PRAGMA user_version.
+# Keep db_schema.sql in sync with the result of applying every step below.
+#
+# Trackers migrate automatically on start-up. To migrate an existing database by hand
+# (a .bak copy is taken first):
+#     python -m price_trackers.migrate [--db path/to/all_cruises.db]
+
+# === VERSION 1: normalized sailings + price_observations ===
+SCHEMA_V1 = """
+CREATE TABLE IF NOT EXISTS sailings (
+    id             INTEGER PRIMARY KEY,
+    line           TEXT NOT NULL,
+    cruise_code    TEXT NOT NULL,
+    cruise_name    TEXT,
+    ship_name      TEXT,
+    departure_port TEXT,
+    departure_date TEXT,
+    duration       INTEGER,
+    UNIQUE (line, cruise_code)
+);
+
+CREATE TABLE IF NOT EXISTS price_observations (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    sailing_id   INTEGER NOT NULL REFERENCES sailings(id),
+    date_checked TEXT NOT NULL,
+    cabin_type   TEXT NOT NULL,
+    fare_type    TEXT NOT NULL,
+    cabin_price  REAL,
+    fixed_obc    REAL,
+    bonus_obc    REAL,
+    obc          REAL,
+    total_price  REAL,
+    drinks_price REAL
+);
+
+CREATE INDEX IF NOT EXISTS idx_observations_series
+    ON price_observations (sailing_id, cabin_type, fare_type, date_checked);
+CREATE INDEX IF NOT EXISTS idx_observations_date
+    ON price_observations (date_checked);
+"""
+
+# The old flat tables live on as views, so existing readers keep working
+# and see dates in the formats they always had
+VIEWS_V1 = """
+CREATE VIEW IF NOT EXISTS po_cruises AS
+SELECT o.id, o.date_checked, s.cruise_code, s.cruise_name, s.ship_name, s.departure_port,
+       CASE WHEN s.departure_date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+            THEN strftime('%d/%m/', s.departure_date) || substr(s.departure_date, 3, 2)
+            ELSE s.departure_date END AS departure_date,
+       s.duration, o.cabin_type, o.fare_type, o.cabin_price,
+       o.fixed_obc, o.bonus_obc, o.total_price, o.drinks_price
+FROM price_observations o
+JOIN sailings s ON s.id = o.sailing_id
+WHERE s.line = 'po';
+
+CREATE VIEW IF NOT EXISTS princess_cruises AS
+SELECT o.id, o.date_checked, s.cruise_code, s.cruise_name, s.ship_name, s.departure_port,
+       CASE WHEN s.departure_date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+            THEN strftime('%d/%m/%Y', s.departure_date)
+            ELSE s.departure_date END AS departure_date,
+       s.duration, o.cabin_type, o.fare_type, o.cabin_price,
+       o.obc, o.total_price
+FROM price_observations o
+JOIN sailings s ON s.id = o.sailing_id
+WHERE s.line = 'princess';
+"""
+
+# Legacy flat table -> (line, extra price columns it carries)
+LEGACY_TABLES = {
+    "po_cruises": ("po", ("fixed_obc", "bonus_obc", "drinks_price")),
+    "princess_cruises": ("princess", ("obc",)),
+}
+
+
+def to_iso_date(value, formats=("%Y-%m-%d", "%d/%m/%Y", "%d/%m/%y", "%Y%m%d")):
+    # Returns value as yyyy-mm-dd, or unchanged if it is not a recognised date
+    if not value:
+        return value
+    for fmt in formats:
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except (TypeError, ValueError):
+            continue
+    return value
+
+
+def _is_table(conn, name):
+    row = conn.execute(
+        "SELECT type FROM sqlite_master WHERE name = ?", (name,)
+    ).fetchone()
+    return row is not None and row[0] == "table"
+
+
+def _copy_legacy_table(conn, table, line, extra_columns):
+    # Latest row wins for the per-sailing attributes
+    latest = {}
+    for code, *attributes in conn.execute(f"""
+        SELECT cruise_code, cruise_name, ship_name, departure_port, departure_date, duration
+        FROM {table} ORDER BY id
+    """):
+        latest[code] = attributes
+    sailing_ids = {
+        code: upsert_sailing(conn, line, code, name, ship, port, to_iso_date(dep_date), duration)
+        for code, (name, ship, port, dep_date, duration) in latest.items()
+    }
+
+    columns = ("sailing_id", "date_checked", "cabin_type", "fare_type", "cabin_price", "total_price") + extra_columns
+    sql = db.insert_sql("price_observations", columns)
+    cursor = conn.execute(f"""
+        SELECT cruise_code, date_checked, cabin_type, fare_type, cabin_price, total_price
+               {''.join(', ' + c for c in extra_columns)}
+        FROM {table} ORDER BY id
+    """)
+    copied = 0
+    while True:
+        batch = cursor.fetchmany(db.DEFAULT_BATCH_SIZE)
+        if not batch:
+            break
+        conn.executemany(sql, [
+            (sailing_ids[row[0]], to_iso_date(row[1])) + tuple(row[2:])
+            for row in batch
+        ])
+        copied += len(batch)
+    conn.execute(f"DROP TABLE {table}")
+    return copied
+
+
+def upsert_sailing(conn, line, cruise_code, cruise_name, ship_name, departure_port, departure_date, duration):
+    conn.execute("""
+        INSERT INTO sailings (line, cruise_code, cruise_name, ship_name, departure_port, departure_date, duration)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (line, cruise_code) DO UPDATE SET
+            cruise_name = excluded.cruise_name,
+            ship_name = excluded.ship_name,
+            departure_port = excluded.departure_port,
+            departure_date = excluded.departure_date,
+            duration = excluded.duration
+    """, (line, cruise_code, cruise_name, ship_name, departure_port, departure_date, duration))
+    return conn.execute(
+        "SELECT id FROM sailings WHERE line = ? AND cruise_code = ?", (line, cruise_code)
+    ).fetchone()[0]
+
+
+def _migrate_v1(conn):
+    for statement in _split(SCHEMA_V1):
+        conn.execute(statement)
+    for table, (line, extra_columns) in LEGACY_TABLES.items():
+        if _is_table(conn, table):
+            copied = _copy_legacy_table(conn, table, line, extra_columns)
+            print(f"📦 Migrated {copied} rows from {table}")
+    for statement in _split(VIEWS_V1):
+        conn.execute(statement)
+
+
+# === VERSION 2: price_summary, kept up to date at ingest ===
+SCHEMA_V2 = """
+CREATE TABLE IF NOT EXISTS price_summary (
+    sailing_id     INTEGER NOT NULL REFERENCES sailings(id),
+    cabin_type     TEXT NOT NULL,
+    fare_type      TEXT NOT NULL,
+    latest_date    TEXT,
+    latest_price   REAL,
+    previous_date  TEXT,
+    previous_price REAL,
+    lowest_price   REAL,
+    lowest_date    TEXT,
+    min_7d         REAL,
+    min_30d        REAL,
+    PRIMARY KEY (sailing_id, cabin_type, fare_type)
+);
+"""
+
+
+
+def _migrate_v2(conn):
+    for statement in _split(SCHEMA_V2):
+        conn.execute(statement)
+    # filled in by version 3, which changes how observations are stored
+
+
+# === VERSION 3: run-length observations (valid_to) + revision cursor ===
+SCHEMA_V3 = """
+ALTER TABLE price_observations ADD COLUMN valid_to TEXT;
+ALTER TABLE price_observations ADD COLUMN revision INTEGER;
+UPDATE price_observations SET valid_to = date_checked, revision = id;
+CREATE INDEX IF NOT EXISTS idx_observations_revision ON price_observations (revision);
+DROP VIEW IF EXISTS po_cruises;
+DROP VIEW IF EXISTS princess_cruises;
+"""
+
+# Same views, plus each row's valid_to and revision
+VIEWS_V3 = """
+CREATE VIEW IF NOT EXISTS po_cruises AS
+SELECT o.id, o.date_checked, s.cruise_code, s.cruise_name, s.ship_name, s.departure_port,
+       CASE WHEN s.departure_date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+            THEN strftime('%d/%m/', s.departure_date) || substr(s.departure_date, 3, 2)
+            ELSE s.departure_date END AS departure_date,
+       s.duration, o.cabin_type, o.fare_type, o.cabin_price,
+       o.fixed_obc, o.bonus_obc, o.total_price, o.drinks_price, o.valid_to, o.revision
+FROM price_observations o
+JOIN sailings s ON s.id = o.sailing_id
+WHERE s.line = 'po';
+
+CREATE VIEW IF NOT EXISTS princess_cruises AS
+SELECT o.id, o.date_checked, s.cruise_code, s.cruise_name, s.ship_name, s.departure_port,
+       CASE WHEN s.departure_date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+            THEN strftime('%d/%m/%Y', s.departure_date)
+            ELSE s.departure_date END AS departure_date,
+       s.duration, o.cabin_type, o.fare_type, o.cabin_price,
+       o.obc, o.total_price, o.valid_to, o.revision
+FROM price_observations o
+JOIN sailings s ON s.id = o.sailing_id
+WHERE s.line = 'princess';
+"""
+
+# Refreshes the summary of every (sailing, cabin, fare) written after `after_revision`.
+# A row's prices hold from date_checked to valid_to, so "previous" is the last day
+# before latest_date that any row covers. Lookups go through idx_observations_series;
+# the all-time low only looks at the new rows.
+# (SQLite returns the date_checked of the MIN() row as a bare column.)
+_COVERS = "o.date_checked <= {0} AND o.valid_to >= {0}"
+_KEY = "o.sailing_id = k.sailing_id AND o.cabin_type = k.cabin_type AND o.fare_type = k.fare_type"
+REFRESH_SUMMARY_SQL = f"""
+WITH new AS (
+    SELECT sailing_id, cabin_type, fare_type,
+           MIN(total_price) AS new_low, date_checked AS new_low_date
+    FROM price_observations
+    WHERE revision > ? AND total_price IS NOT NULL
+    GROUP BY sailing_id, cabin_type, fare_type
+), latest AS (
+    SELECT k.*, (SELECT MAX(valid_to) FROM price_observations o WHERE {_KEY}) AS latest_date
+    FROM new k
+), dated AS (
+    SELECT k.*, (SELECT MAX(MIN(o.valid_to, date(k.latest_date, '-1 day'))) FROM price_observations o
+                 WHERE {_KEY} AND o.date_checked < k.latest_date) AS previous_date
+    FROM latest k
+)
+INSERT INTO price_summary (
+    sailing_id, cabin_type, fare_type, latest_date, latest_price, previous_date, previous_price,
+    lowest_price, lowest_date, min_7d, min_30d
+)
+SELECT k.sailing_id, k.cabin_type, k.fare_type,
+       k.latest_date,
+       (SELECT MIN(total_price) FROM price_observations o WHERE {_KEY} AND {_COVERS.format("k.latest_date")}),
+       k.previous_date,
+       (SELECT MIN(total_price) FROM price_observations o WHERE {_KEY} AND {_COVERS.format("k.previous_date")}),
+       k.new_low, k.new_low_date,
+       (SELECT MIN(total_price) FROM price_observations o WHERE {_KEY} AND o.valid_to > date(k.latest_date, '-7 days')),
+       (SELECT MIN(total_price) FROM price_observations o WHERE {_KEY} AND o.valid_to > date(k.latest_date, '-30 days'))
+FROM dated k
+WHERE true
+ON CONFLICT (sailing_id, cabin_type, fare_type) DO UPDATE SET
+    latest_date = excluded.latest_date,
+    latest_price = excluded.latest_price,
+    previous_date = excluded.previous_date,
+    previous_price = excluded.previous_price,
+    lowest_date = CASE WHEN lowest_price IS NULL OR excluded.lowest_price < lowest_price
+                       THEN excluded.lowest_date ELSE lowest_date END,
+    lowest_price = MIN(COALESCE(lowest_price, excluded.lowest_price), excluded.lowest_price),
+    min_7d = excluded.min_7d,
+    min_30d = excluded.min_30d
+"""
+
+
+def refresh_summary(conn, after_revision=0):
+    conn.execute(REFRESH_SUMMARY_SQL, (after_revision,))
+
+
+def _migrate_v3(conn):
+    for statement in _split(SCHEMA_V3):
+        conn.execute(statement)
+    for statement in _split(VIEWS_V3):
+        conn.execute(statement)
+    conn.execute("DELETE FROM price_summary")
+    refresh_summary(conn)  # build it from the existing history
+
+
+# === VERSION 4: run journal, so an interrupted run can resume ===
+SCHEMA_V4 = """
+CREATE TABLE IF NOT EXISTS runs (
+    id          INTEGER PRIMARY KEY,
+    line        TEXT NOT NULL,
+    run_date    TEXT NOT NULL,
+    started_at  TEXT NOT NULL,
+    finished_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS run_journal (
+    run_id      INTEGER NOT NULL REFERENCES runs(id),
+    cruise_code TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    cruise_name TEXT,
+    reason      TEXT,
+    PRIMARY KEY (run_id, cruise_code)
+);
+"""
+
+
+def _migrate_v4(conn):
+    for statement in _split(SCHEMA_V4):
+        conn.execute(statement)
+
+
+# === VERSION 5: daily exchange rates (see fx.py) ===
+SCHEMA_V5 = """
+CREATE TABLE IF NOT EXISTS fx_rates (
+    base       TEXT NOT NULL,
+    quote      TEXT NOT NULL,
+    rate_date  TEXT NOT NULL,
+    rate       REAL NOT NULL,
+    source     TEXT,
+    fetched_at TEXT,
+    PRIMARY KEY (base, quote, rate_date)
+);
+"""
+
+
+def _migrate_v5(conn):
+    for statement in _split(SCHEMA_V5):
+        conn.execute(statement)
+
+
+# === VERSION 6: adaptive schedule (see scheduler.py) ===
+SCHEMA_V6 = """
+CREATE TABLE IF NOT EXISTS schedule (
+    line         TEXT NOT NULL,
+    cruise_code  TEXT NOT NULL,
+    next_due     TEXT NOT NULL,
+    priority     REAL NOT NULL,
+    last_checked TEXT,
+    PRIMARY KEY (line, cruise_code)
+);
+"""
+
+
+def _migrate_v6(conn):
+    for statement in _split(SCHEMA_V6):
+        conn.execute(statement)
+
+
+# === VERSION 7: sync epoch, bumped when history rows are deleted ===
+# Clients syncing deltas from /changes never see deleted rows; a new epoch tells them
+# to drop their copy and sync again from the start.
+SCHEMA_V7 = """
+CREATE TABLE IF NOT EXISTS sync_state (
+    id    INTEGER PRIMARY KEY CHECK (id = 1),
+    epoch INTEGER NOT NULL
+);
+
+INSERT OR IGNORE INTO sync_state (id, epoch) VALUES (1, 1);
+"""
+
+
+def _migrate_v7(conn):
+    for statement in _split(SCHEMA_V7):
+        conn.execute(statement)
+
+
+def compact(conn):
+    # Folds runs of unchanged prices already in the history into single rows, the same
+    # way ObservationSink(dedupe=True) does at ingest. Returns the number of rows removed.
+    revision = conn.execute("SELECT COALESCE(MAX(revision), 0) FROM price_observations").fetchone()[0]
+    extended, deleted = {}, []
+    key, runs = None, []
+    for row in conn.execute(f"""
+        SELECT id, sailing_id, cabin_type, fare_type, date_checked, valid_to, {', '.join(db.PRICE_COLUMNS)}
+        FROM price_observations
+        ORDER BY sailing_id, cabin_type, fare_type, date_checked, id
+    """):
+        row_id, row_key, date_checked, valid_to, prices = row[0], row[1:4], row[4], row[5], row[6:]
+        if row_key != key:
+            key, runs = row_key, []
+        # Only runs ending on the last day covered before this row can be extended
+        last_end = max((end for _, end, _ in runs if end < date_checked), default=None)
+        runs = [run for run in runs if run[1] >= (last_end or "")]
+        for run in runs:
+            if run[1] == last_end and run[2] == prices:
+                run[1] = valid_to
+                extended[run[0]] = valid_to
+                deleted.append(row_id)
+                break
+        else:
+            runs.append([row_id, valid_to, prices])
+
+    conn.executemany(
+        "UPDATE price_observations SET valid_to = ?, revision = ? WHERE id = ?",
+        [(valid_to, revision + i, row_id) for i, (row_id, valid_to) in enumerate(extended.items(), 1)]
+    )
+    conn.executemany("DELETE FROM price_observations WHERE id = ?", [(row_id,) for row_id in deleted])
+    if deleted:
+        conn.execute("UPDATE sync_state SET epoch = epoch + 1")
+    return len(deleted)
+
+
+def _split(script):
+    return [s.strip() for s in script.split(";") if s.strip()]
+
+
+MIGRATIONS = [
+    _migrate_v1,
+    _migrate_v2,
+    _migrate_v3,
+    _migrate_v4,
+    _migrate_v5,
+    _migrate_v6,
+    _migrate_v7,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(conn):
+    # Applies every pending migration in one transaction; returns the versions applied
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    if current >= SCHEMA_VERSION:
+        return []
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Re-check now that we hold the write lock - another process may have migrated
+        current = conn.execute("PRAGMA user_version").fetchone()[0]
+        applied = []
+        for version in range(current + 1, SCHEMA_VERSION + 1):
+            MIGRATIONS[version - 1](conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            applied.append(version)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return applied
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migrate all_cruises.db to the latest schema")
+    parser.add_argument("--db", default=db.DB_PATH, help="database file to migrate")
+    parser.add_argument("--no-backup", action="store_true", help="skip copying the database first")
+    parser.add_argument("--compact", action="store_true",
+                        help="merge unchanged daily prices into valid_from/valid_to ranges, then VACUUM")
+    args = parser.parse_args(argv)
+
+    if not args.no_backup:
+        backup_path = args.db + ".bak"
+        src = sqlite3.connect(args.db)
+        dst = sqlite3.connect(backup_path)
+        src.backup(dst)
+        dst.close()
+        src.close()
+        print(f"💾 Backed up database to {backup_path}")
+
+    conn = sqlite3.connect(args.db, timeout=db.BUSY_TIMEOUT)
+    applied = migrate(conn)
+    if applied:
+        print(f"✅ Applied migrations {applied}; schema is at version {SCHEMA_VERSION}")
+    else:
+        print(f"✅ Already at schema version {SCHEMA_VERSION}")
+
+    if args.compact:
+        with conn:
+            removed = compact(conn)
+        conn.execute("VACUUM")
+        print(f"🗜️ Compacted history: removed {removed} unchanged rows")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
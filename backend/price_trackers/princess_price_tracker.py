@@ -1,32 +1,63 @@
-import os
-import json
-import sqlite3
-import requests
-from datetime import datetime, date
-from pathlib import Path
+import gzip
+import time
+from datetime import datetime
+from price_trackers import http_cache, json_stream, fx
+from price_trackers.tracker import Tracker, register
 
-def main():
-    # === TEST MODE ===
-    TEST_MODE = False  # 👈 Set to False for real run
-    print(f"Running in {'TEST' if TEST_MODE else 'LIVE'} mode")
-    
-    # === CONFIG ===
-    config_path = Path(__file__).resolve().parents[1] / "config" / "princess_config.json"
-    removed_path = Path(__file__).resolve().parents[1] / "config" / "removed_cruises.json"
-    
-    with open(config_path, 'r') as f:
-        config = json.load(f)
-        
-    with open(removed_path, 'r') as f:
-        removed = json.load(f)
-        
-    cruise_codes = config.get("cruise_codes", [])
-    cabins = config.get("cabins", {})
-    ships = config.get("ships", {})
-    ports = config.get("ports", {})
+# === FARES REQUEST TEMPLATE ===
+# Built once; only filters.cruises changes between requests
+FARES_PAYLOAD_TEMPLATE = {
+    "booking": {
+        "bookingAgency": {
+            "id": "DIRPB",
+            "address": {"stateId":"X","countryId":"GB"},
+            "phones":[{"phoneTypeId":"W","number":"1234567"},{"phoneTypeId":"F","number":"11111111"}],
+            "creditCardChargeFeesFlag":"Y",
+            "countryCanBooks":["IE"],
+            "borderCountries":["GB","GI","MT","IE"],
+            "currencies":[{"id":"GBP"},{"id":"EUR"}],
+            "collectDirectInfoFlag":"N",
+            "dsms":[{"year":"2025","region":"R0","district":"00"}],
+            "commissions":[{"year":"2025","associationCode":"@DEFAULT","association":"DEFAULT ASSOCIATION","salesProgram":"DI","typeFlag":"DIR"}],
+            "internationalFaxFlag":"Y",
+            "confirmationMethod":"F",
+            "edocsFlag":"N"
+        },
+        "currencyCode":"GBP",
+        "guests":[{"country":"GB","homeCity":"LON"},{"country":"GB","homeCity":"LON"}],
+        "couponCodes":[]
+    },
+    "filters":{
+        "availabilities":["Y","G","B"],
+        "cruiseType":"C",
+        "cruises": [],
+        "meta":"I"
+    },
+    "leadInBy":"itins",
+    "retrieveFlags":{
+        "additionalGuestFare": True,
+        "averageFare": False,
+        "fareType": "BESTFARE",
+        "includeMisc": False,
+        "includeTfpe": True,
+        "roundUpFare": True,
+        "subMeta": True,
+        "zones": True
+    }
+}
+
+def build_fares_payload(cruise_code):
+    # Shallow copy - the shared nested parts of the template are never mutated
+    payload = dict(FARES_PAYLOAD_TEMPLATE)
+    payload["filters"] = {**FARES_PAYLOAD_TEMPLATE["filters"], "cruises": [cruise_code]}
+    return payload
 
-    today = date.today().isoformat()
-    USD_TO_GBP = 0.78
+
+@register
+class PrincessTracker(Tracker):
+    name = "Princess"
+    line = "princess"
+    config_file = "princess_config.json"
 
     # === HEADERS/COOKIES ===
     headers = {
@@ -46,238 +77,193 @@ def main():
         "Sec-Fetch-Mode": "cors",
         "Sec-Fetch-Site": "same-site",
     }
-
     cookies = {
         "countryCode": "GB",
         "currencyCode": "GBP"
     }
-
-    # === DATABASE SETUP ===
-    if TEST_MODE:
-        conn = sqlite3.connect(":memory:")  # In-memory DB for testing
-        print("⚙️ Using in-memory database (no data will persist)")
-    else:
-        ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        db_path = os.path.join(ROOT_DIR, "all_cruises.db")
-        conn = sqlite3.connect(db_path)
-
-    cursor = conn.cursor()
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS princess_cruises (
-        id             INTEGER PRIMARY KEY AUTOINCREMENT,
-        date_checked   TEXT,
-        cruise_code    TEXT,
-        cruise_name    TEXT,
-        ship_name      TEXT,
-        departure_port TEXT,
-        departure_date TEXT,
-        duration       INTEGER,
-        cabin_type     TEXT,
-        fare_type      TEXT,
-        cabin_price    REAL,
-        obc            REAL,
-        total_price    REAL
-    )
-    """)
-    conn.commit()
-
-    # === STEP 1: Get metadata dump once ===
     url_meta = (
         "https://gw.api.princess.com/pcl-web/internal/resdb/p1.0/products"
         "?agencyCountry=GB&cruiseType=C&voyageStatus=A&webDisplay=Y"
         "&promoFilter=all&light=false"
     )
-    response_meta = requests.get(url_meta, headers=headers, cookies=cookies)
-    cruise_meta_list = []
 
-    if response_meta.status_code == 200:
-        cruise_meta_list = response_meta.json().get("products", [])
-        print(f"📥 Retrieved {len(cruise_meta_list)} cruises from metadata API")   
-    else:
-        print(f"❌ Failed to fetch metadata API ({response_meta.status_code})")
+    def __init__(self, test_mode=False, db_path=None, full_run=False):
+        super().__init__(test_mode, db_path, full_run)
+        self.cache = http_cache.cache_settings(self.config)
+        self.meta_path = None
+        self.meta_source = None
+        self.products_by_id, self.meta_cruises = {}, {}
+        self.fx = None
+        # Flip mapping so we can look up cabin names by ID
+        self.id_to_name = {v: k for k, v in self.config.get("cabins", {}).items()}
 
+    def prepare(self, session):
+        # === STEP 1: Get metadata dump once (or reuse the cached copy) ===
+        start = time.perf_counter()
+        self.meta_path, self.meta_source = http_cache.fetch_cached(
+            session, self.url_meta, self.cache["cache_dir"], self.cache["ttl"], self.settings["timeout"]
+        )
+        if self.meta_source != "cache":
+            self.stats.requests += 1
+            self.stats.request(time.perf_counter() - start)
+        if self.meta_source in ("stale", "failed"):
+            self.stats.error("fetch")
+        if not self.meta_path:
+            print("❌ Failed to fetch metadata API")
+        else:
+            # Read and indexed once per run, keeping only the products of the cruises we
+            # track; every chunk's products are then dict lookups
+            cruise_meta_list = load_metadata(self.meta_path, self.watch, self.cache["stream"])
+            print(f"📥 Loaded {len(cruise_meta_list)} tracked products from metadata API ({self.meta_source})")
+            self.products_by_id, self.meta_cruises = index_metadata(cruise_meta_list)
 
-    # === STEP 2: Loop through fares API ===
-    for cruise_code in cruise_codes:
-        url_fares = f"https://gw.api.princess.com/pcl-web/internal/caps/pc/pricing/v1/cruises/{cruise_code}"
-        payload = {
-            "booking": {
-                "bookingAgency": {
-                    "id": "DIRPB",
-                    "address": {"stateId":"X","countryId":"GB"},
-                    "phones":[{"phoneTypeId":"W","number":"1234567"},{"phoneTypeId":"F","number":"11111111"}],
-                    "creditCardChargeFeesFlag":"Y",
-                    "countryCanBooks":["IE"],
-                    "borderCountries":["GB","GI","MT","IE"],
-                    "currencies":[{"id":"GBP"},{"id":"EUR"}],
-                    "collectDirectInfoFlag":"N",
-                    "dsms":[{"year":"2025","region":"R0","district":"00"}],
-                    "commissions":[{"year":"2025","associationCode":"@DEFAULT","association":"DEFAULT ASSOCIATION","salesProgram":"DI","typeFlag":"DIR"}],
-                    "internationalFaxFlag":"Y",
-                    "confirmationMethod":"F",
-                    "edocsFlag":"N"
-                },
-                "currencyCode":"GBP",
-                "guests":[{"country":"GB","homeCity":"LON"},{"country":"GB","homeCity":"LON"}],
-                "couponCodes":[]
-            },
-            "filters":{
-                "availabilities":["Y","G","B"],
-                "cruiseType":"C",
-                "cruises": [cruise_code],
-                "meta":"I"
-            },
-            "leadInBy":"itins",
-            "retrieveFlags":{
-                "additionalGuestFare": True,
-                "averageFare": False,
-                "fareType": "BESTFARE",
-                "includeMisc": False,
-                "includeTfpe": True,
-                "roundUpFare": True,
-                "subMeta": True,
-                "zones": True
-            }
-        }
-        
-        response_fares = requests.post(url_fares, json=payload, headers=headers, cookies=cookies)
-        
-        if response_fares.status_code != 200:
-            print(f"❌ Error {response_fares.status_code} for cruise {cruise_code}")
-            continue
+        # Today's USD -> GBP rate for the OBC, looked up once for the whole run
+        provider = fx.make_provider(self.config, self.test_mode, self.settings["timeout"])
+        self.fx = fx.CurrencyService(self.conn, provider)
+        self.fx.rate("USD", "GBP", self.today)
+
+    def build_request(self, cruise_code):
+        # === STEP 2: Fetch fares for every cruise (in parallel, by the engine) ===
+        return (
+            "POST",
+            f"https://gw.api.princess.com/pcl-web/internal/caps/pc/pricing/v1/cruises/{cruise_code}",
+            {"json": build_fares_payload(cruise_code)},
+        )
+
+    def parse(self, cruise_code, fares_data):
+        # === STEP 3: Match the fares to the metadata indexed in prepare() ===
+        ships = self.config.get("ships", {})
+        ports = self.config.get("ports", {})
 
-        fares_data = response_fares.json()
-        print(f"✅ Got fares for {cruise_code}")
-        
         fare_products = fares_data.get("products", [])
         if not fare_products:
             print(f"No products found for cruise code {cruise_code} - removing from tracking")
-            remove_cruise(cruise_code, "Unknown", config, removed, "No products found in Metadata")
-            continue
-        else:
-            fare_product = fare_products[0]
-            meta_id = fare_product["id"]
-            
-            # -- Find corresponding metadata --
-            meta_product = next(
-                (p for p in cruise_meta_list if p.get("id") == meta_id),
-                None
-            )
-            if not meta_product:
-                print(f"Product with id {meta_id} not found - removing from tracking")
-                remove_cruise(cruise_code, "Unknown", config, removed, "No matching product in Metadata")
-                continue
-            
-            cruise_name = meta_product.get("name")
-            meta_cruise = next(
-                (c for c in meta_product.get("cruises", []) if c.get("id") == cruise_code),
-                None
-            )
-            if not meta_cruise:
-                print(f"Cruise with id {cruise_code} not found under product {meta_id}")
-                remove_cruise(cruise_code, cruise_name, config, removed, "No matching cruise in Metadata")
-                continue
-            ship_id = meta_cruise["voyage"]["ship"]["id"]
-            ship_name = ships.get(ship_id, ship_id)
-            departure_port_id = meta_cruise["voyage"]["startPortId"]
-            departure_port_name = ports.get(departure_port_id, departure_port_id)
-            departure_date = meta_cruise["voyage"]["sailDate"]
-            departure_date = datetime.strptime(departure_date, "%Y%m%d").strftime("%d/%m/%Y")
-            duration = meta_cruise["voyage"]["duration"]
-            
-            # -- Find cruise data --
-            cruise = fare_product.get("cruises", [])[0]
-            
-            # Flip mapping so we can look up cabin names by ID  
-            id_to_name = {v: k for k, v in cabins.items()}
-            
-            fares = {
-                "BESTFARE": {},
-                "BESTVALUE": {}
-            }
-            
-            for fare in cruise.get("pricing", {}).get("fares", []):
-                faretype = fare.get("fareType")
+            self.remove(cruise_code, "Unknown", "No products found in Metadata")
+            return None
+        fare_product = fare_products[0]
+        meta_id = fare_product["id"]
+
+        # -- Find corresponding metadata --
+        meta_product = self.products_by_id.get(meta_id)
+        if not meta_product:
+            print(f"Product with id {meta_id} not found - removing from tracking")
+            self.remove(cruise_code, "Unknown", "No matching product in Metadata")
+            return None
 
-                for category in fare.get("categories", []):
-                    cabin_id = category.get("id")
-                    if cabin_id not in id_to_name:
-                        continue  # skip other cabin types
-                    cabin_name = id_to_name[cabin_id]
+        cruise_name = meta_product.get("name")
+        meta_cruise = self.meta_cruises.get((meta_id, cruise_code))
+        if not meta_cruise:
+            print(f"Cruise with id {cruise_code} not found under product {meta_id}")
+            self.remove(cruise_code, cruise_name, "No matching cruise in Metadata")
+            return None
+        ship_id = meta_cruise["voyage"]["ship"]["id"]
+        departure_port_id = meta_cruise["voyage"]["startPortId"]
+        departure_date = meta_cruise["voyage"]["sailDate"]
+        sailing = {
+            "cruise_name": cruise_name,
+            "ship_name": ships.get(ship_id, ship_id),
+            "departure_port": ports.get(departure_port_id, departure_port_id),
+            "departure_date": datetime.strptime(departure_date, "%Y%m%d").date().isoformat(),
+            "duration": meta_cruise["voyage"]["duration"],
+        }
 
-                    # find guest 1
-                    guest1 = next((g for g in category.get("guests", []) if g.get("id") == 1), None)
-                    if not guest1:
-                        continue
-                    
-                    # find guest 2
-                    guest2 = next((g for g in category.get("guests", []) if g.get("id") == 2), None)
-                    if not guest2:
-                        continue
-                    
-                    price = guest1.get("fare") + guest2.get("fare")
-                    obc_usd = guest1.get("obc", 0) + guest2.get("obc", 0)
-                    obc = round(obc_usd * USD_TO_GBP, 2) if obc_usd else 0 # convert to GBP
-                    
-                    
-                    # save into fare_results
-                    fares[faretype][cabin_name] = {
-                        "price": price,
-                        "obc": obc,
-                        "net_price": price - obc 
-                    }
-                    
-            # === STEP 3: Insert Into DB ===
-            for fare_type, fare_cabins in fares.items():
-                for cabin_name, data in fare_cabins.items():
-                    if not data or not data.get("price"):
-                        continue
-                     
-                    cursor.execute("""
-                        INSERT INTO princess_cruises (
-                            date_checked, cruise_code, cruise_name, ship_name, departure_port,
-                            departure_date, duration, cabin_type, fare_type, cabin_price,
-                            obc, total_price
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        today,
-                        cruise_code,
-                        cruise_name,
-                        ship_name,
-                        departure_port_name,
-                        departure_date,
-                        duration,
-                        cabin_name,
-                        fare_type,
-                        data["price"],
-                        data["obc"],
-                        data["net_price"]
-                    ))
+        # -- Find cruise data --
+        cruise = fare_product.get("cruises", [])[0]
 
-    # === SAVE UPDATED CONFIG ===
-    if not TEST_MODE:
-        config["cruise_codes"] = cruise_codes
-        with open(config_path, 'w') as f:
-            json.dump(config, f, indent=4)
+        fares = {
+            "BESTFARE": {},
+            "BESTVALUE": {}
+        }
 
-        with open(removed_path, 'w') as f:
-            json.dump(removed, f, indent=4)
+        for fare in cruise.get("pricing", {}).get("fares", []):
+            faretype = fare.get("fareType")
+
+            for category in fare.get("categories", []):
+                cabin_id = category.get("id")
+                if cabin_id not in self.id_to_name:
+                    continue  # skip other cabin types
+                cabin_name = self.id_to_name[cabin_id]
+
+                # find guests 1 and 2 (first entry wins, as before)
+                guests = {}
+                for g in category.get("guests", []):
+                    guests.setdefault(g.get("id"), g)
+                guest1 = guests.get(1)
+                if not guest1:
+                    continue
+                guest2 = guests.get(2)
+                if not guest2:
+                    continue
+
+                # save into fare_results; obc is in USD until converted below
+                fares[faretype][cabin_name] = {
+                    "price": guest1.get("fare") + guest2.get("fare"),
+                    "obc": guest1.get("obc", 0) + guest2.get("obc", 0),
+                }
+
+        # -- Rows for the DB --
+        rows = []
+        for fare_type, fare_cabins in fares.items():
+            for cabin_name, data in fare_cabins.items():
+                if not data or not data.get("price"):
+                    continue
+                rows.append({
+                    "cabin_type": cabin_name,
+                    "fare_type": fare_type,
+                    "cabin_price": data["price"],
+                    "obc": data["obc"],
+                })
+        # Convert every fare's OBC to GBP with one rate lookup
+        self.fx.convert_batch(rows, ("obc",), "USD", "GBP", self.today)
+        for row in rows:
+            row["total_price"] = row["cabin_price"] - row["obc"]
+        return sailing, rows
+
+
+def main():
+    # === TEST MODE ===
+    TEST_MODE = False  # 👈 Set to False for real run
+    return PrincessTracker(test_mode=TEST_MODE).run()
+
+def project_product(product):
+    # Keeps only the metadata fields parse() reads, so the full catalogue is never held
+    cruises = []
+    for cruise in product.get("cruises", []):
+        voyage = cruise.get("voyage") or {}
+        projected = {k: voyage[k] for k in ("startPortId", "sailDate", "duration") if k in voyage}
+        if "ship" in voyage:
+            projected["ship"] = {"id": (voyage["ship"] or {}).get("id")}
+        cruises.append({"id": cruise.get("id"), "voyage": projected})
+    return {"id": product.get("id"), "name": product.get("name"), "cruises": cruises}
+
+def has_cruise(product, cruise_codes):
+    # A product's cruises[].id are cruise codes
+    return any(cruise.get("id") in cruise_codes for cruise in product.get("cruises", []))
+
+def load_metadata(meta_path, cruise_codes, stream=False):
+    # The products holding any of cruise_codes
+    if not stream:
+        products = http_cache.load_json(meta_path).get("products", [])
+        return [product for product in products if has_cruise(product, cruise_codes)]
+    # Stream-parse: decode one product at a time and keep the projected wanted ones
+    with gzip.open(meta_path, 'rt', encoding='utf-8') as f:
+        return [
+            project_product(product)
+            for product in json_stream.iter_array(f, "products")
+            if has_cruise(product, cruise_codes)
+        ]
+
+def index_metadata(products):
+    # Maps product id -> product and (product id, cruise id) -> cruise.
+    # setdefault keeps the first match, same as the old linear next() scans.
+    products_by_id = {}
+    cruises_by_key = {}
+    for product in products:
+        product_id = product.get("id")
+        products_by_id.setdefault(product_id, product)
+        for cruise in product.get("cruises", []):
+            cruises_by_key.setdefault((product_id, cruise.get("id")), cruise)
+    return products_by_id, cruises_by_key
 
-    conn.commit()
-    conn.close()
-    print("\n✅ Done! Config and database updated successfully.")
-    
-def remove_cruise(cruise_code, cruise_name, config, removed, reason):
-    cruise_codes = config.get("cruise_codes", [])
-    if cruise_code in cruise_codes:
-        cruise_codes.remove(cruise_code)
-        removed.append({
-            "timestamp": datetime.now().isoformat(),
-            "brand": "princess",
-            "cruise_code": cruise_code,
-            "cruise_name": cruise_name,
-            "reason": reason
-        })
-    
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
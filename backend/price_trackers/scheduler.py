@@ -0,0 +1,160 @@
+from datetime import date, timedelta
+from price_trackers import db
+
+# Adaptive scheduling: each cruise gets a priority from how often its prices moved
+# recently and how close it is to departure, and a next_due date in the schedule
+# table. A run only fetches the cruises that are due, highest priority first, up to
+# the request budget (with "fill_budget", budget left over goes to the cruises due
+# soonest). Configured per line with a "schedule" section:
+#     "schedule": {"enabled": true, "budget": 200, "max_interval_days": 7}
+# Without it (or with master.py --full) every cruise is fetched on every run.
+
+DEFAULTS = {
+    "enabled": False,
+    "budget": None,             # most cruises fetched per run; None for no limit
+    "fill_budget": False,       # spend budget the due cruises leave on those due soonest
+    "max_interval_days": 7,     # longest gap between checks of a quiet, far-off sailing
+    "window_days": 30,          # how far back price changes count towards volatility
+    "min_history_days": 30,     # sailings checked over fewer days than this count as volatile
+    "near_departure_days": 30,  # sailings this close are checked every run
+    "far_departure_days": 365,  # from here on departure adds nothing to the priority
+}
+
+
+def schedule_settings(config):
+    settings = {**DEFAULTS, **config.get("schedule", {})}
+    settings["enabled"] = bool(settings["enabled"])
+    settings["fill_budget"] = bool(settings["fill_budget"])
+    settings["max_interval_days"] = max(1, int(settings["max_interval_days"]))
+    settings["min_history_days"] = max(0, int(settings["min_history_days"]))
+    if settings["budget"] is not None:
+        settings["budget"] = int(settings["budget"])
+        if settings["budget"] < 1:
+            raise ValueError(f"schedule budget must be at least 1 (or null for no limit), got {settings['budget']}")
+    return settings
+
+
+def priority(changes, series, history_days, days_to_departure, settings):
+    # 0 (quiet, far away) .. 1 (check every run)
+    # Volatility: 1 once each fare changes about weekly over the window. Too short a
+    # history says nothing about how often prices move, so new sailings count as volatile.
+    weekly = series * settings["window_days"] / 7
+    if not weekly or history_days < settings["min_history_days"]:
+        volatility = 1.0
+    else:
+        volatility = min(1.0, changes / weekly)
+    # Urgency: 1 inside near_departure_days, falling to 0 at far_departure_days
+    if days_to_departure is None:
+        urgency = 0.0
+    else:
+        near, far = settings["near_departure_days"], settings["far_departure_days"]
+        urgency = min(1.0, max(0.0, (far - days_to_departure) / max(1, far - near)))
+    return max(volatility, urgency)
+
+
+def interval_days(score, settings):
+    return max(1, round(1 + (settings["max_interval_days"] - 1) * (1 - score)))
+
+
+def score_sailings(conn, line, today, settings):
+    # {cruise_code: priority} for every stored sailing of the line
+    since = (today - timedelta(days=settings["window_days"])).isoformat()
+    rows = conn.execute("""
+        WITH recent AS (
+            SELECT o.sailing_id, o.cabin_type, o.fare_type, o.total_price,
+                   LAG(o.total_price) OVER (
+                       PARTITION BY o.sailing_id, o.cabin_type, o.fare_type
+                       ORDER BY o.date_checked, o.id
+                   ) AS previous_price
+            FROM price_observations o
+            JOIN sailings s ON s.id = o.sailing_id
+            WHERE s.line = ? AND o.valid_to >= ?
+        ),
+        moves AS (
+            SELECT sailing_id,
+                   SUM(previous_price IS NOT NULL AND total_price IS NOT previous_price) AS changes,
+                   COUNT(DISTINCT cabin_type || '|' || fare_type) AS series
+            FROM recent
+            GROUP BY sailing_id
+        ),
+        history AS (
+            -- Days from the first check to the last, however many rows they were stored in
+            SELECT o.sailing_id,
+                   julianday(MAX(COALESCE(o.valid_to, o.date_checked))) - julianday(MIN(o.date_checked)) + 1 AS days
+            FROM price_observations o
+            JOIN sailings s ON s.id = o.sailing_id
+            WHERE s.line = ?
+            GROUP BY o.sailing_id
+        )
+        SELECT s.cruise_code, s.departure_date, COALESCE(m.changes, 0), COALESCE(m.series, 0),
+               COALESCE(h.days, 0)
+        FROM sailings s
+        LEFT JOIN moves m ON m.sailing_id = s.id
+        LEFT JOIN history h ON h.sailing_id = s.id
+        WHERE s.line = ?
+    """, (line, since, line, line)).fetchall()
+
+    scores = {}
+    for cruise_code, departure_date, changes, series, history_days in rows:
+        try:
+            days_to_departure = (date.fromisoformat(departure_date) - today).days
+        except (TypeError, ValueError):
+            days_to_departure = None
+        scores[cruise_code] = priority(changes, series, history_days, days_to_departure, settings)
+    return scores
+
+
+def due(conn, line, cruise_codes, today, settings):
+    # Returns (cruise codes to fetch this run in cruise_codes order, number that were due).
+    # Every code that is due (or has never been scheduled) is fetched, keeping the highest
+    # priority ones within the budget; with fill_budget, budget they leave goes to the
+    # codes due soonest.
+    schedule = {
+        code: (next_due, score)
+        for code, next_due, score in conn.execute(
+            "SELECT cruise_code, next_due, priority FROM schedule WHERE line = ?", (line,)
+        )
+    }
+    today_iso = today.isoformat()
+    ranked, early = [], []
+    for position, code in enumerate(cruise_codes):
+        next_due, score = schedule.get(code, (None, 1.0))
+        if next_due is None or next_due <= today_iso:
+            # Highest priority first, then longest overdue, then config order
+            ranked.append((-score, next_due or "", position, code))
+        else:
+            # Not due yet: soonest due first, then highest priority
+            early.append((next_due, -score, position, code))
+    due_count = len(ranked)
+    ranked.sort()
+    if settings["budget"] is not None:
+        if settings["fill_budget"]:
+            early.sort()
+            ranked += early
+        ranked = ranked[:settings["budget"]]
+    chosen = {code for *_, code in ranked}
+    return [code for code in cruise_codes if code in chosen], due_count
+
+
+def reschedule(conn, line, checked_codes, cruise_codes, today, settings):
+    # Sets next_due for the cruises checked this run and drops codes no longer tracked
+    scores = score_sailings(conn, line, today, settings)
+    rows = []
+    for code in checked_codes:
+        score = scores.get(code, 1.0)
+        next_due = today + timedelta(days=interval_days(score, settings))
+        rows.append((line, code, next_due.isoformat(), round(score, 3), today.isoformat()))
+    tracked = set(cruise_codes)
+    stale = [
+        (line, code)
+        for (code,) in conn.execute("SELECT cruise_code FROM schedule WHERE line = ?", (line,))
+        if code not in tracked
+    ]
+    with db.write_lock:
+        conn.executemany("""
+            INSERT OR REPLACE INTO schedule (line, cruise_code, next_due, priority, last_checked)
+            VALUES (?, ?, ?, ?, ?)
+        """, rows)
+        conn.executemany("DELETE FROM schedule WHERE line = ? AND cruise_code = ?", stale)
+        conn.commit()
+    return len(rows)
@@ -0,0 +1,231 @@
+import json
+import pkgutil
+import importlib
+from datetime import date, datetime
+from pathlib import Path
+from price_trackers import http_client, db, config_store, scheduler
+from price_trackers.metrics import RunStats
+
+CONFIG_DIR = Path(__file__).resolve().parents[1] / "config"
+REMOVED_PATH = CONFIG_DIR / "removed_cruises.jsonl"        # append-only, one removal per line
+LEGACY_REMOVED_PATH = CONFIG_DIR / "removed_cruises.json"  # moved into REMOVED_PATH on first append
+
+# Cruises fetched, stored and committed per checkpoint; overridable with db.checkpoint_every
+DEFAULT_CHECKPOINT_EVERY = 100
+
+# === REGISTRY ===
+# Tracker classes by display name, in the order master.py runs them
+TRACKERS = {}
+
+
+def register(tracker_cls):
+    # Class decorator for each cruise line's Tracker subclass
+    TRACKERS[tracker_cls.name] = tracker_cls
+    return tracker_cls
+
+
+def discover():
+    # Imports every price_trackers/*_price_tracker.py so their @register calls run
+    import price_trackers
+    for module in pkgutil.iter_modules(price_trackers.__path__):
+        if module.name.endswith("_price_tracker"):
+            importlib.import_module(f"price_trackers.{module.name}")
+    return TRACKERS
+
+
+class Tracker:
+    # Shared engine for one cruise line: fetch -> parse -> persist.
+    # A line sets the attributes below and implements build_request() and parse();
+    # the rest (sessions, concurrency, retries, batching, removals, config and stats)
+    # lives here so every line gets it.
+    name = None         # shown in logs and the run summary, e.g. "P&O"
+    line = None         # sailings.line and the removed_cruises.jsonl brand, e.g. "po"
+    config_file = None  # file in config/
+    headers = {}
+    cookies = {}
+
+    def __init__(self, test_mode=False, db_path=None, full_run=False):
+        # test_mode leaves the live database and config files alone;
+        # full_run fetches every cruise even when the line has a schedule
+        self.test_mode = test_mode
+        self.db_path = db_path
+        self.full_run = full_run
+        self.config_path = CONFIG_DIR / self.config_file
+        with open(self.config_path, 'r') as f:
+            self.config = json.load(f)
+        self.cruise_codes = self.config.get("cruise_codes", [])
+        self.watch = set()  # cruise_codes still tracked; filled when the run starts
+        self.removed = []  # removals from this run, appended to removed_cruises.jsonl at the end
+        self.today = date.today()
+        self.settings = http_client.fetch_settings(self.config)
+        self.breaker = http_client.CircuitBreaker(
+            self.settings["breaker_threshold"], self.settings["breaker_cooldown"]
+        )
+        self.checkpoint_every = max(1, int(
+            self.config.get("db", {}).get("checkpoint_every", DEFAULT_CHECKPOINT_EVERY)
+        ))
+        self.schedule = scheduler.schedule_settings(self.config)
+        self.stats = RunStats(self.name)
+        self.conn = None  # the run's database connection, for hooks that need it
+
+    # === HOOKS FOR EACH LINE ===
+    # parse() is called for every decoded response, one checkpoint chunk at a time
+    def build_request(self, cruise_code):
+        # Returns (method, url, requests kwargs) for one cruise
+        raise NotImplementedError
+
+    def parse(self, cruise_code, data):
+        # Returns (sailing, rows) for one decoded response, or None to store nothing.
+        # sailing holds the ObservationSink.sailing() fields besides cruise_code;
+        # each row holds ObservationSink.add() keyword arguments (cabin_type, fare_type, prices)
+        raise NotImplementedError
+
+    def prepare(self, session):
+        # One-off requests before the per-cruise fetch (self.conn is open by now)
+        pass
+
+    def decode(self, response):
+        return response.json()
+
+    def remove(self, cruise_code, cruise_name, reason):
+        # Stops tracking a cruise from the next run on
+        if cruise_code not in self.watch:
+            return
+        self.watch.discard(cruise_code)
+        self.config.get("routes", {}).pop(cruise_code, None)
+        self.removed.append({
+            "timestamp": datetime.now().isoformat(),
+            "brand": self.line,
+            "cruise_code": cruise_code,
+            "cruise_name": cruise_name,
+            "reason": reason
+        })
+
+    # === STAGES ===
+    def fetch(self, session, cruise_codes):
+        # Returns [(cruise_code, decoded data)] for every request that succeeded, in cruise_codes order.
+        # Retries with backoff and the per-host circuit breaker live in http_client.
+        with self.stats.timed("fetch"):
+            jobs = [(code,) + tuple(self.build_request(code)) for code in cruise_codes]
+            results = http_client.fetch_all(session, jobs, breaker=self.breaker, **self.settings)
+        self.stats.requests += sum(result.attempts for result in results)
+        for result in results:
+            for latency in result.latencies:
+                self.stats.request(latency)
+            if result.ok:
+                self.stats.bytes_received += len(result.response.content)
+
+        decoded = []
+        with self.stats.timed("decode"):
+            for result in results:
+                if not result.ok:
+                    print(f"❌ Request error for {result.key} after {result.attempts} attempt(s): {result.error}")
+                    self.stats.error("fetch")
+                    continue
+                try:
+                    decoded.append((result.key, self.decode(result.response)))
+                except Exception as e:
+                    print(f"❌ JSON parse error for {result.key}: {e}")
+                    self.stats.error("decode")
+        return decoded
+
+    def persist(self, sink, cruise_code, sailing, rows):
+        if not rows:
+            return
+        sailing_id = sink.sailing(cruise_code, **sailing)
+        for row in rows:
+            sink.add(sailing_id, self.today.isoformat(), **row)
+
+    def process(self, sink, decoded):
+        # Parses and stores one chunk; returns its run_journal entries
+        entries = []
+        for cruise_code, data in decoded:  # cruise_codes order, so removals are safe
+            removed_before = len(self.removed)
+            try:
+                with self.stats.timed("parse"):
+                    parsed = self.parse(cruise_code, data)
+            except Exception as e:
+                print(f"❌ Could not parse {cruise_code}: {e}")
+                self.stats.error("parse")
+                continue  # not journaled, so a resumed run tries it again
+            if parsed:
+                with self.stats.timed("insert"):
+                    self.persist(sink, cruise_code, *parsed)
+            if len(self.removed) > removed_before:
+                removal = self.removed[-1]
+                entries.append((cruise_code, "removed", removal["cruise_name"], removal["reason"]))
+            else:
+                entries.append((cruise_code, "stored", None, None))
+        return entries
+
+    def save_config(self):
+        # Only this run's removals are written, under a file lock, so runs in parallel
+        # (threads or processes) never overwrite each other's changes
+        config_store.remove_codes(self.config_path, [entry["cruise_code"] for entry in self.removed])
+        config_store.append_removed(REMOVED_PATH, self.removed, LEGACY_REMOVED_PATH)
+
+    def run(self):
+        print(f"Running {self.name} in {'TEST' if self.test_mode else 'LIVE'} mode")
+        conn = self.conn = db.connect(self.test_mode, self.db_path)
+        try:
+            db.ensure_schema(conn)
+            self.watch = set(self.cruise_codes)
+
+            # === RESUME ===
+            # An interrupted run today has committed whole chunks; skip the cruises it finished
+            # and redo its removals, since the config is only saved at the end
+            run_id, journal = db.start_run(conn, self.line, self.today.isoformat())
+            if journal:
+                print(f"⏯️ Resuming today's {self.name} run: {len(journal)} cruises already done")
+                for code, (status, cruise_name, reason) in journal.items():
+                    if status == "removed":
+                        self.remove(code, cruise_name, reason)
+            # dict.fromkeys keeps config order but fetches a code listed twice only once
+            pending = [code for code in dict.fromkeys(self.cruise_codes) if code not in journal]
+
+            # === SCHEDULE ===
+            # The cruises that are due, most volatile / soonest to sail first, within the budget
+            if self.schedule["enabled"] and not self.full_run:
+                chosen, due_count = scheduler.due(conn, self.line, pending, self.today, self.schedule)
+                print(f"🗓️ {due_count} of {len(pending)} cruises due today, fetching {len(chosen)} "
+                      f"(budget {self.schedule['budget'] or 'unlimited'})")
+                pending = chosen
+
+            # Rows are buffered and written with executemany; each chunk is its own transaction
+            sink = db.ObservationSink(conn, self.line, **db.db_settings(self.config))
+            session = http_client.make_session(self.headers, self.cookies, pool_size=self.settings["max_in_flight"])
+            try:
+                with self.stats.timed("fetch"):
+                    self.prepare(session)
+                print(f"Fetching {len(pending)} cruises ({self.settings['max_in_flight']} at a time)...")
+                for start in range(0, len(pending), self.checkpoint_every):
+                    decoded = self.fetch(session, pending[start:start + self.checkpoint_every])
+                    try:
+                        entries = self.process(sink, decoded)
+                    except BaseException:
+                        sink.rollback()  # earlier chunks stay committed
+                        raise
+                    try:
+                        with self.stats.timed("insert"):
+                            db.checkpoint(conn, sink, run_id, entries)
+                    except Exception:
+                        self.stats.error("insert")
+                        raise
+            finally:
+                session.close()
+
+            if self.schedule["enabled"]:
+                checked = [code for code, (status, _, _) in db.run_journal(conn, run_id).items() if status == "stored"]
+                scheduler.reschedule(conn, self.line, checked, self.watch, self.today, self.schedule)
+            db.finish_run(conn, run_id)
+        finally:
+            conn.close()  # also when a stage raised
+        self.stats.rows_inserted += sink.written
+        self.stats.rows_extended += sink.extended_count
+        self.stats.removed += len(self.removed)
+
+        if not self.test_mode:
+            self.save_config()
+
+        print(f"\n✅ Done! {self.name} config and database updated successfully.")
+        return self.stats.finish()
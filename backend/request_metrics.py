@@ -0,0 +1,174 @@
+import os
+import io
+import time
+import random
+import pstats
+import cProfile
+import threading
+from collections import deque
+from contextlib import contextmanager
+from flask import g, request, has_request_context
+
+# Per-endpoint timing for the Flask server. Every request records its latency,
+# response size and the time spent in named phases (sql / build / serialize) that
+# the views mark with `with request_metrics.phase("sql"):`. The totals are served
+# at /metrics; requests slower than SLOW_REQUEST_MS are logged with their phases.
+#
+# PROFILE_SAMPLE_RATE (0-1, default 0) runs cProfile on that fraction of requests
+# and prints the top functions for each, to see where the time goes inside a phase.
+
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", 500))
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_TOP = 15
+WINDOW = 1024  # most recent latencies kept per endpoint for the percentiles
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class EndpointStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0  # 5xx responses
+        self.bytes = 0
+        self.total = 0.0
+        self.latencies = deque(maxlen=WINDOW)
+        self.phases = {}
+
+    def record(self, elapsed, status, size, phases):
+        self.count += 1
+        self.errors += status >= 500
+        self.bytes += size
+        self.total += elapsed
+        self.latencies.append(elapsed)
+        for name, seconds in phases.items():
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def as_dict(self):
+        latencies = sorted(self.latencies)
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "avg_bytes": round(self.bytes / self.count) if self.count else 0,
+            "latency_ms": {
+                "avg": round(1000 * self.total / self.count, 2) if self.count else 0.0,
+                **{f"p{p}": round(1000 * percentile(latencies, p), 2) for p in PERCENTILES},
+                "max": round(1000 * latencies[-1], 2) if latencies else 0.0,
+            },
+            # Average milliseconds per request in each phase; "other" is routing,
+            # the response cache and anything the view didn't mark
+            "phases_ms": {
+                name: round(1000 * seconds / self.count, 2)
+                for name, seconds in sorted(self.phases.items())
+            },
+        }
+
+
+class RequestMetrics:
+    def __init__(self, app=None, slow_ms=SLOW_REQUEST_MS, profile_rate=PROFILE_SAMPLE_RATE):
+        self.slow_ms = slow_ms
+        self.profile_rate = profile_rate
+        self.endpoints = {}
+        self.lock = threading.Lock()
+        self.profile_lock = threading.Lock()  # one profiled request at a time
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.teardown_request(self.teardown_request)
+
+    @contextmanager
+    def phase(self, name):
+        # Adds the time spent in the block to the current request's phase `name`
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if has_request_context() and "metrics_phases" in g:
+                g.metrics_phases[name] = g.metrics_phases.get(name, 0.0) + time.perf_counter() - start
+
+    def before_request(self):
+        g.metrics_start = time.perf_counter()
+        g.metrics_phases = {}
+        g.metrics_profiler = None
+        if self.profile_rate and random.random() < self.profile_rate and self.profile_lock.acquire(blocking=False):
+            g.metrics_profiler = cProfile.Profile()
+            g.metrics_profiler.enable()
+
+    def after_request(self, response):
+        if "metrics_start" not in g:
+            return response
+        elapsed = time.perf_counter() - g.metrics_start
+        phases = dict(g.metrics_phases)
+        phases["other"] = max(0.0, elapsed - sum(phases.values()))
+        endpoint = request.url_rule.rule if request.url_rule else "(unmatched)"
+        size = response.content_length or 0
+
+        with self.lock:
+            stats = self.endpoints.setdefault(endpoint, EndpointStats())
+            stats.record(elapsed, response.status_code, size, phases)
+
+        response.headers["Server-Timing"] = ", ".join(
+            f"{name};dur={1000 * seconds:.1f}" for name, seconds in phases.items()
+        )
+        if elapsed * 1000 >= self.slow_ms:
+            detail = " ".join(f"{name}={1000 * seconds:.0f}ms" for name, seconds in phases.items())
+            print(f"🐢 Slow request: {request.full_path.rstrip('?')} took {1000 * elapsed:.0f}ms "
+                  f"({response.status_code}, {size} bytes) {detail}")
+        return response
+
+    def teardown_request(self, exc):
+        profiler = g.pop("metrics_profiler", None)
+        if profiler is None:
+            return
+        profiler.disable()
+        self.profile_lock.release()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        print(f"🔬 Profile of {request.full_path.rstrip('?')}:\n{out.getvalue()}")
+
+    def snapshot(self):
+        with self.lock:
+            return {endpoint: stats.as_dict() for endpoint, stats in sorted(self.endpoints.items())}
+
+    def prometheus_text(self):
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP cruise_api_requests_total Requests served.",
+            "# TYPE cruise_api_requests_total counter",
+        ]
+        lines += [f'cruise_api_requests_total{{endpoint="{e}"}} {s["count"]}' for e, s in snapshot.items()]
+        lines += [
+            "# HELP cruise_api_errors_total 5xx responses.",
+            "# TYPE cruise_api_errors_total counter",
+        ]
+        lines += [f'cruise_api_errors_total{{endpoint="{e}"}} {s["errors"]}' for e, s in snapshot.items()]
+        lines += [
+            "# HELP cruise_api_response_bytes_total Response body bytes sent.",
+            "# TYPE cruise_api_response_bytes_total counter",
+        ]
+        lines += [f'cruise_api_response_bytes_total{{endpoint="{e}"}} {s["bytes"]}' for e, s in snapshot.items()]
+        lines += [
+            "# HELP cruise_api_latency_seconds Latency percentiles over the most recent requests.",
+            "# TYPE cruise_api_latency_seconds gauge",
+        ]
+        for e, s in snapshot.items():
+            for p in PERCENTILES:
+                lines.append(f'cruise_api_latency_seconds{{endpoint="{e}",quantile="0.{p}"}} '
+                             f'{s["latency_ms"][f"p{p}"] / 1000}')
+        lines += [
+            "# HELP cruise_api_phase_seconds Average seconds per request in each phase.",
+            "# TYPE cruise_api_phase_seconds gauge",
+        ]
+        for e, s in snapshot.items():
+            for name, ms in s["phases_ms"].items():
+                lines.append(f'cruise_api_phase_seconds{{endpoint="{e}",phase="{name}"}} {ms / 1000}')
+        return "\n".join(lines) + "\n"
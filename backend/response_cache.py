@@ -0,0 +1,110 @@
+import os
+import gzip
+import hashlib
+import threading
+from functools import wraps
+from collections import OrderedDict
+from flask import request, make_response
+
+try:
+    import brotli  # optional - only used when installed
+except ImportError:
+    brotli = None
+
+# In-process cache of finished JSON responses. Entries are keyed by path + query
+# string and thrown away as soon as the database file changes, so a hit serves
+# bytes (already compressed) without touching SQLite or re-serializing.
+
+MAX_ENTRIES = 256
+MIN_COMPRESS_SIZE = 1024  # smaller bodies aren't worth compressing
+KEEP_HEADERS = ("Content-Type", "X-Next-Cursor")
+
+
+class CachedResponse:
+    def __init__(self, response):
+        self.body = response.get_data()
+        self.headers = {h: response.headers[h] for h in KEEP_HEADERS if h in response.headers}
+        self.etag = hashlib.sha256(self.body).hexdigest()[:32]
+        self.encoded = {}
+        if len(self.body) >= MIN_COMPRESS_SIZE:
+            self.encoded["gzip"] = gzip.compress(self.body, compresslevel=6)
+            if brotli is not None:
+                self.encoded["br"] = brotli.compress(self.body, quality=5)
+
+    def choose_encoding(self):
+        # Best content-coding the client accepts, or None for the plain body
+        for encoding in ("br", "gzip"):
+            if encoding in self.encoded and encoding in request.accept_encodings:
+                return encoding
+        return None
+
+    def respond(self):
+        # Each content-coding is its own representation, so gets its own strong ETag
+        encoding = self.choose_encoding()
+        etag = f"{self.etag}-{encoding}" if encoding else self.etag
+        if etag in request.if_none_match:
+            response = make_response("", 304)
+        else:
+            response = make_response(self.encoded[encoding] if encoding else self.body)
+            if encoding:
+                response.headers["Content-Encoding"] = encoding
+            response.headers.update(self.headers)
+        response.set_etag(etag)
+        # Browsers keep the body but check back every time, getting a 304 when unchanged
+        response.headers["Cache-Control"] = "no-cache"
+        response.vary.add("Accept-Encoding")
+        return response
+
+
+class ResponseCache:
+    def __init__(self, db_file, max_entries=MAX_ENTRIES):
+        self.db_file = db_file
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.version = None
+        self.lock = threading.Lock()
+
+    def db_version(self):
+        # Trackers write in WAL mode, so new data lands in the -wal file before the main file
+        version = []
+        for path in (self.db_file, self.db_file + "-wal"):
+            try:
+                st = os.stat(path)
+                version.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                version.append(None)
+        return tuple(version)
+
+    def get(self, key):
+        version = self.db_version()
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.version = version
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry, version
+
+    def put(self, key, version, entry):
+        with self.lock:
+            if version != self.version:
+                return  # the database changed while this response was being built
+            self.entries[key] = entry
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def cached(self, view):
+        # Decorator for GET views returning a JSON response
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (request.path, tuple(sorted(request.args.items(multi=True))))
+            entry, version = self.get(key)
+            if entry is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                entry = CachedResponse(response)
+                self.put(key, version, entry)
+            return entry.respond()
+        return wrapper
@@ -1,56 +1,469 @@
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request
 from flask_cors import CORS
-import sqlite3
 import os
-from datetime import datetime
+import sqlite3
+from datetime import datetime, timedelta
+from db_pool import ReadOnlyPool
+from response_cache import ResponseCache
+from request_metrics import RequestMetrics
 
 app = Flask(__name__)
-CORS(app)  # Allow cross-origin requests
+CORS(app, expose_headers=["X-Next-Cursor"])  # Allow cross-origin requests
 
 DB_FILE = os.path.join(os.path.dirname(__file__), "all_cruises.db")
 print("Using database at:", DB_FILE)
 
+# Read-only connections reused across requests in each worker
+db_pool = ReadOnlyPool(DB_FILE)
+
+# Finished responses are reused until the database file changes
+response_cache = ResponseCache(DB_FILE)
+
+# Latency, size and sql / build / serialize phase times per endpoint, served at /metrics
+request_metrics = RequestMetrics(app)
+
+# Columns each table (view) exposes; also the whitelist for ?fields=
+TABLE_COLUMNS = {
+    "po_cruises": (
+        "id", "date_checked", "cruise_code", "cruise_name", "ship_name", "departure_port",
+        "departure_date", "duration", "cabin_type", "fare_type", "cabin_price",
+        "fixed_obc", "bonus_obc", "total_price", "drinks_price", "valid_to", "revision",
+    ),
+    "princess_cruises": (
+        "id", "date_checked", "cruise_code", "cruise_name", "ship_name", "departure_port",
+        "departure_date", "duration", "cabin_type", "fare_type", "cabin_price",
+        "obc", "total_price", "valid_to", "revision",
+    ),
+}
+MAX_PAGE_SIZE = 10000
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y")  # add any formats you expect
+
+
+class QueryError(ValueError):
+    pass
+
+
+@app.errorhandler(QueryError)
+def handle_query_error(e):
+    return jsonify({"error": str(e)}), 400
 
-def get_cruises(table_name):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute(f"SELECT * FROM {table_name}")  # fetch all columns
-    rows = cursor.fetchall()
 
-    columns = [col[0] for col in cursor.description]
+def parse_date(value, param):
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    raise QueryError(f"{param} must be a date like 2025-10-31 or 31/10/2025")
 
-    cruises = []
+
+def format_date(raw_date):
+    # dd/mm/yyyy for the frontend; ISO dates (what the trackers store) skip strptime
+    if len(raw_date) == 10 and raw_date[4] == "-" and raw_date[7] == "-":
+        return f"{raw_date[8:10]}/{raw_date[5:7]}/{raw_date[0:4]}"
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(raw_date, fmt).strftime("%d/%m/%Y")
+        except ValueError:
+            continue
+    return raw_date
+
+
+def days_between(start, end):
+    # ISO dates from start to end inclusive
+    day, last = datetime.fromisoformat(start), datetime.fromisoformat(end)
+    while day <= last:
+        yield day.date().isoformat()
+        day += timedelta(days=1)
+
+
+def expand_rows(rows, date_from=None, date_to=None):
+    # Rows hold prices valid from date_checked to valid_to; this turns each into one
+    # row per day (clipped to date_from..date_to), i.e. the dense daily series
+    expanded = []
     for row in rows:
-        cruise = {columns[i]: row[i] for i in range(len(columns))}
+        start = max(row["date_checked"], date_from or "")
+        end = min(row["valid_to"] or row["date_checked"], date_to or "9999-12-31")
+        for day in days_between(start, end):
+            expanded.append({**row, "date_checked": day, "valid_to": day})
+    return expanded
+
+
+def build_query(table_name, args, cursor="id", expand=False, after_param="after"):
+    # Turns the request's query parameters into one parameterized SELECT:
+    #   cruise_code, cabin_type, fare_type  - exact match, comma-separated for several
+    #   date_from, date_to                   - inclusive range of days the prices were valid
+    #   fields                               - comma-separated columns to return
+    #   limit, after                         - keyset pagination on the cursor column
+    # after_param names the request parameter "after" came from, for error messages
+    columns = TABLE_COLUMNS[table_name]
+    fields = columns
+    if args.get("fields"):
+        fields = tuple(f.strip() for f in args["fields"].split(",") if f.strip())
+        unknown = [f for f in fields if f not in columns]
+        if unknown:
+            raise QueryError(f"Unknown fields: {', '.join(unknown)}")
+    # The cursor is always selected so the next page can be worked out,
+    # and the date range whenever rows are to be expanded
+    needed = (cursor, "date_checked", "valid_to") if expand else (cursor,)
+    select = fields + tuple(c for c in needed if c not in fields)
+
+    where, params = [], []
+    for column in ("cruise_code", "cabin_type", "fare_type"):
+        if args.get(column):
+            values = [v for v in args[column].split(",") if v]
+            where.append(f"{column} IN ({', '.join('?' for _ in values)})")
+            params.extend(values)
+    if args.get("date_from"):
+        where.append("valid_to >= ?")
+        params.append(parse_date(args["date_from"], "date_from"))
+    if args.get("date_to"):
+        where.append("date_checked <= ?")
+        params.append(parse_date(args["date_to"], "date_to"))
+    if args.get("after"):
+        try:
+            params.append(int(args["after"]))
+        except ValueError:
+            raise QueryError(f"{after_param} must be an integer {cursor}")
+        where.append(f"{cursor} > ?")
 
-        # Normalize date_checked
-        raw_date = cruise.get("date_checked")
-        if raw_date:
-            for fmt in ("%Y-%m-%d", "%d/%m/%Y"):  # add any formats you expect
-                try:
-                    dt = datetime.strptime(raw_date, fmt)
-                    cruise["date_checked"] = dt.strftime("%d/%m/%Y")
-                    break
-                except ValueError:
-                    continue
+    limit = None
+    if args.get("limit"):
+        try:
+            limit = int(args["limit"])
+        except ValueError:
+            raise QueryError("limit must be an integer")
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise QueryError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
 
-        cruises.append(cruise)
+    sql = f"SELECT {', '.join(select)} FROM {table_name}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {cursor}"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit + 1)  # one extra row tells us whether there is a next page
+    return sql, params, fields, limit
 
-    conn.close()
-    return cruises
+
+def get_cruises(table_name, args=None, cursor="id", after_param="after"):
+    # Returns (rows, next_cursor); next_cursor is None on the last page.
+    # With expand=1 every stored row becomes one row per day it was valid.
+    args = args or {}
+    expand = args.get("expand") in ("1", "true")
+    sql, params, fields, limit = build_query(table_name, args, cursor, expand, after_param)
+
+    with request_metrics.phase("sql"), db_pool.connection() as conn:
+        cruises = conn.execute(sql, params).fetchall()  # rows come back as dicts
+
+    with request_metrics.phase("build"):
+        next_cursor = None
+        if limit and len(cruises) > limit:
+            cruises = cruises[:limit]
+            next_cursor = cruises[-1][cursor]
+
+        if expand:
+            cruises = expand_rows(
+                cruises,
+                parse_date(args["date_from"], "date_from") if args.get("date_from") else None,
+                parse_date(args["date_to"], "date_to") if args.get("date_to") else None,
+            )
+
+        extra = [c for c in cruises[0] if c not in fields] if cruises else []
+        for cruise in cruises:
+            for column in extra:
+                del cruise[column]
+
+            # Normalize dates
+            for column in ("date_checked", "valid_to"):
+                if cruise.get(column):
+                    cruise[column] = format_date(cruise[column])
+
+    return cruises, next_cursor
+
+
+def cruises_response(table_name):
+    cruises, next_cursor = get_cruises(table_name, request.args)
+    with request_metrics.phase("serialize"):
+        response = jsonify(cruises)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return response
 
 
 # Endpoint for P&O
 @app.route("/cruises/po", methods=["GET"])
+@response_cache.cached
 def cruises_po():
-    return jsonify(get_cruises("po_cruises"))
+    return cruises_response("po_cruises")
 
 
 # Endpoint for Princess
 @app.route("/cruises/princess", methods=["GET"])
+@response_cache.cached
 def cruises_princess():
-    return jsonify(get_cruises("princess_cruises"))
+    return cruises_response("princess_cruises")
+
+
+# === DELTA SYNC ===
+def get_changes(table_name, args):
+    # Rows added or extended after a cursor, for clients that keep their own copy of
+    # the history (merge by id - an extended row comes back with a later valid_to).
+    # A client whose stored epoch differs from the one returned must drop its rows and
+    # sync again from since=0: migrate --compact deleted rows it still holds.
+    #   since       - last revision the client has (0 or missing for everything)
+    #   since_date  - alternatively, only rows still valid after this date
+    query = {"limit": str(MAX_PAGE_SIZE), "after": args.get("since") or "0"}
+    if args.get("since_date"):
+        since_date = datetime.fromisoformat(parse_date(args["since_date"], "since_date"))
+        query["date_from"] = (since_date + timedelta(days=1)).date().isoformat()
+    rows, next_cursor = get_cruises(table_name, query, cursor="revision", after_param="since")
+
+    if rows:
+        cursor = rows[-1]["revision"]
+    elif args.get("since_date") and not args.get("since"):
+        # Nothing newer than the date: hand back the current high-water mark
+        with request_metrics.phase("sql"), db_pool.connection() as conn:
+            cursor = conn.execute(
+                f"SELECT MAX(revision) AS revision FROM {table_name}"
+            ).fetchone()["revision"] or 0
+    else:
+        cursor = int(query["after"])
+
+    with request_metrics.phase("sql"), db_pool.connection() as conn:
+        try:
+            epoch = conn.execute("SELECT epoch FROM sync_state").fetchone()["epoch"]
+        except sqlite3.OperationalError:
+            epoch = 1  # database not migrated to schema 7 yet
+    return {"rows": rows, "cursor": cursor, "more": next_cursor is not None, "epoch": epoch}
+
+
+# Only the observations changed after ?since=<revision>, plus the cursor to send next time
+@app.route("/cruises/po/changes", methods=["GET"])
+@response_cache.cached
+def cruises_po_changes():
+    changes = get_changes("po_cruises", request.args)
+    with request_metrics.phase("serialize"):
+        return jsonify(changes)
+
+
+@app.route("/cruises/princess/changes", methods=["GET"])
+@response_cache.cached
+def cruises_princess_changes():
+    changes = get_changes("princess_cruises", request.args)
+    with request_metrics.phase("serialize"):
+        return jsonify(changes)
+
+
+# === SUMMARY ===
+SUMMARY_DATES = ("departure_date", "latest_date", "previous_date", "lowest_date")
+
+
+def get_summary(args):
+    # One row per sailing / cabin / fare from price_summary (no history scan)
+    #   line, cruise_code  - filters (comma-separated for several)
+    #   drops=1            - only prices that fell at the latest check
+    where, params = [], []
+    for column in ("line", "cruise_code"):
+        if args.get(column):
+            values = args[column].split(",")
+            where.append(f"s.{column} IN ({', '.join('?' for _ in values)})")
+            params.extend(values)
+    if args.get("drops") in ("1", "true"):
+        where.append("p.latest_price < p.previous_price")
+
+    sql = """
+        SELECT s.line, s.cruise_code, s.cruise_name, s.ship_name, s.departure_date,
+               p.cabin_type, p.fare_type, p.latest_date, p.latest_price,
+               p.previous_date, p.previous_price,
+               ROUND(p.latest_price - p.previous_price, 2) AS price_change,
+               p.lowest_price, p.lowest_date, p.min_7d, p.min_30d
+        FROM price_summary p
+        JOIN sailings s ON s.id = p.sailing_id
+    """
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY s.line, s.departure_date, s.cruise_code, p.cabin_type, p.fare_type"
+
+    with request_metrics.phase("sql"), db_pool.connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    with request_metrics.phase("build"):
+        for row in rows:
+            for column in SUMMARY_DATES:
+                if row[column]:
+                    row[column] = format_date(row[column])
+    return rows
+
+
+# Current price, change since the previous check and lows for every fare
+@app.route("/cruises/summary", methods=["GET"])
+@response_cache.cached
+def cruises_summary():
+    summary = get_summary(request.args)
+    with request_metrics.phase("serialize"):
+        return jsonify(summary)
+
+
+# === PRICE GRAPH ===
+LINES = ("po", "princess")
+MAX_SERIES = 10
+
+
+def parse_selections(values):
+    # Each ?series= value is line:cruise_code:cabin_type:fare_type[:drinks]
+    selections = []
+    for value in values:
+        parts = value.split(":")
+        if len(parts) not in (4, 5) or parts[0] not in LINES or not all(parts[1:4]):
+            raise QueryError("series must look like po:A644A:Inside:Saver (append :drinks to add drinks)")
+        if len(parts) == 5 and parts[4] != "drinks":
+            raise QueryError(f"Unknown series option {parts[4]!r}")
+        selections.append({
+            "line": parts[0],
+            "cruise_code": parts[1],
+            "cabin_type": parts[2],
+            "fare_type": parts[3],
+            "include_drinks": len(parts) == 5,
+        })
+    if not selections:
+        raise QueryError("At least one series is required")
+    if len(selections) > MAX_SERIES:
+        raise QueryError(f"At most {MAX_SERIES} series can be requested at once")
+    return selections
+
+
+def downsample(dates, series, max_points):
+    # Keeps the last date of each bucket and, per series, the last value seen in it,
+    # which is what a step chart of the full data would show at that point
+    if not max_points or len(dates) <= max_points:
+        return dates, series
+    step = -(-len(dates) // max_points)  # ceiling division
+    ends = list(range(step - 1, len(dates), step))
+    if ends[-1] != len(dates) - 1:
+        ends.append(len(dates) - 1)
+    sampled = []
+    for values in series:
+        out, start = [], 0
+        for end in ends:
+            bucket = [v for v in values[start:end + 1] if v is not None]
+            out.append(bucket[-1] if bucket else None)
+            start = end + 1
+        sampled.append(out)
+    return [dates[i] for i in ends], sampled
+
+
+def get_series(args):
+    # One grouped query for every selection, aligned on the union of their dates
+    selections = parse_selections(args.getlist("series"))
+    date_from = parse_date(args["date_from"], "date_from") if args.get("date_from") else "0000-01-01"
+    date_to = parse_date(args["date_to"], "date_to") if args.get("date_to") else "9999-12-31"
+    max_points = None
+    if args.get("max_points"):
+        try:
+            max_points = max(2, int(args["max_points"]))
+        except ValueError:
+            raise QueryError("max_points must be an integer")
+
+    values_sql = ", ".join("(?, ?, ?, ?, ?, ?)" for _ in selections)
+    params = []
+    for idx, sel in enumerate(selections):
+        params += [idx, sel["line"], sel["cruise_code"], sel["cabin_type"], sel["fare_type"], int(sel["include_drinks"])]
+    params += [date_from, date_to]
+
+    with request_metrics.phase("sql"), db_pool.connection() as conn:
+        rows = conn.execute(f"""
+        WITH sel(idx, line, cruise_code, cabin_type, fare_type, drinks) AS (VALUES {values_sql})
+        SELECT sel.idx AS idx, o.date_checked, o.valid_to,
+               o.total_price + CASE WHEN sel.drinks THEN COALESCE(o.drinks_price, 0) ELSE 0 END AS price
+        FROM sel
+        JOIN sailings s ON s.line = sel.line AND s.cruise_code = sel.cruise_code
+        JOIN price_observations o ON o.sailing_id = s.id
+             AND o.cabin_type = sel.cabin_type AND o.fare_type = sel.fare_type
+        WHERE o.valid_to >= ? AND o.date_checked <= ?
+        """, params).fetchall()
+        names = {
+            row["key"]: row["cruise_name"]
+            for row in conn.execute(f"""
+            SELECT line || ':' || cruise_code AS key, cruise_name FROM sailings
+            WHERE line || ':' || cruise_code IN ({', '.join('?' for _ in selections)})
+            """, [f"{sel['line']}:{sel['cruise_code']}" for sel in selections])
+        }
+
+    with request_metrics.phase("build"):
+        return build_series(selections, rows, names, date_from, date_to, max_points)
+
+
+def build_series(selections, rows, names, date_from, date_to, max_points):
+    # Spread each stored run over the days it covers, keeping the cheapest per day
+    daily = {}
+    for row in expand_rows(rows, date_from, date_to):
+        key = (row["idx"], row["date_checked"])
+        if row["price"] is not None and (daily.get(key) is None or row["price"] < daily[key]):
+            daily[key] = row["price"]
+        else:
+            daily.setdefault(key, None)
+    dates = sorted({date for _, date in daily})
+    position = {date: i for i, date in enumerate(dates)}
+    values = [[None] * len(dates) for _ in selections]
+    for (idx, date), price in daily.items():
+        values[idx][position[date]] = price
+
+    dates, values = downsample(dates, values, max_points)
+    return {
+        "dates": dates,
+        "series": [
+            {**sel, "cruise_name": names.get(f"{sel['line']}:{sel['cruise_code']}"), "values": vals}
+            for sel, vals in zip(selections, values)
+        ],
+    }
+
+
+def get_series_options():
+    # Distinct cruise / cabin / fare combinations per line, for the graph's dropdowns
+    with request_metrics.phase("sql"), db_pool.connection() as conn:
+        rows = conn.execute("""
+        SELECT DISTINCT s.line, s.cruise_code, s.cruise_name, o.cabin_type, o.fare_type
+        FROM price_observations o
+        JOIN sailings s ON s.id = o.sailing_id
+        ORDER BY s.line, s.cruise_code, o.cabin_type, o.fare_type
+        """).fetchall()
+
+    options = {line: {} for line in LINES}
+    for row in rows:
+        cruise = options.setdefault(row["line"], {}).setdefault(
+            row["cruise_code"], {"cruise_name": row["cruise_name"], "cabins": {}}
+        )
+        cruise["cabins"].setdefault(row["cabin_type"], []).append(row["fare_type"])
+    return options
+
+
+# Chart-ready series, e.g. /cruises/series?series=po:A644A:Inside:Saver&series=princess:4639:Balcony:BESTFARE
+@app.route("/cruises/series", methods=["GET"])
+@response_cache.cached
+def cruises_series():
+    series = get_series(request.args)
+    with request_metrics.phase("serialize"):
+        return jsonify(series)
+
+
+# Cruise / cabin / fare choices for the price graph
+@app.route("/cruises/series/options", methods=["GET"])
+@response_cache.cached
+def cruises_series_options():
+    options = get_series_options()
+    with request_metrics.phase("serialize"):
+        return jsonify(options)
+
+
+# === METRICS ===
+# Per-endpoint request count, latency percentiles, response sizes and phase times
+# since the worker started (?format=prometheus for the Prometheus text format)
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    if request.args.get("format") == "prometheus":
+        return request_metrics.prometheus_text(), 200, {"Content-Type": "text/plain; version=0.0.4"}
+    return jsonify(request_metrics.snapshot())
 
 
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import './App.css';
+import { loadCruises } from './cruiseStore';
 
 function POCruisesTable() {
   const [cruises, setCruises] = useState([]);
@@ -7,8 +8,7 @@ function POCruisesTable() {
   useEffect(() => {
     const fetchCruises = async () => {
       try {
-        const response = await fetch('https://cruise-price-tracking-webapp.onrender.com/cruises/po');
-        const data = await response.json();
+        const data = await loadCruises('po');
 
         // ✅ Filter to only unique cruise_code entries
         const uniqueCruises = [];
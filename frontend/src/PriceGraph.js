@@ -2,45 +2,70 @@ import React, { useState, useEffect } from 'react';
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, Label } from 'recharts';
 import './PriceGraph.css';
 
+const API_BASE = 'https://cruise-price-tracking-webapp.onrender.com';
+// The server draws at most this many lines per request (MAX_SERIES in server.py)
+const MAX_SERIES = 10;
+
+// Rejects on a non-2xx response, with the server's {error} message when it sent one
+async function fetchJson(url, options) {
+  const res = await fetch(url, options);
+  const body = await res.json().catch(() => null);
+  if (!res.ok) {
+    throw new Error(body?.error || `Request failed (${res.status})`);
+  }
+  return body;
+}
+
 function PriceGraph() {
-  const [poCruises, setPoCruises] = useState([]);
-  const [princessCruises, setPrincessCruises] = useState([]);
+  const [options, setOptions] = useState({ po: {}, princess: {} });
   const [selectedCruises, setSelectedCruises] = useState([]);
+  const [series, setSeries] = useState({ dates: [], series: [] });
+  const [error, setError] = useState('');
 
-  // --- DATE NORMALIZATION ---
-  const normalizeDate = (str) => {
-    if (!str) return str;
-
-    const parts = str.split(/[-/]/).map(Number);
+  // Fetch the cruise / cabin / fare choices once
+  useEffect(() => {
+    fetchJson(`${API_BASE}/cruises/series/options`)
+      .then(setOptions)
+      .catch(err => {
+        console.error(err);
+        setError(err.message);
+      });
+  }, []);
 
-    // If first part > 31, it's already yyyy-mm-dd
-    if (parts[0] > 31) {
-      const [y, m, d] = parts;
-      return `${y.toString().padStart(4, "0")}-${m.toString().padStart(2, "0")}-${d
-        .toString()
-        .padStart(2, "0")}`;
-    }
+  // Only fully chosen rows are drawn
+  const completeSelections = selectedCruises.filter(
+    sel => sel.cruiseLine && sel.cruise_code && sel.cabin_type && sel.fare_type
+  );
 
-    // Otherwise assume dd-mm-yyyy
-    const [d, m, y] = parts;
-    return `${y.toString().padStart(4, "0")}-${m.toString().padStart(2, "0")}-${d
-      .toString()
-      .padStart(2, "0")}`;
-  };
+  // Each series is line:cruise_code:cabin_type:fare_type[:drinks]
+  const seriesKeys = completeSelections.map(sel =>
+    [sel.cruiseLine, sel.cruise_code, sel.cabin_type, sel.fare_type]
+      .concat(sel.includeDrinks && sel.cruiseLine === 'po' ? ['drinks'] : [])
+      .join(':')
+  );
+  const seriesQuery = seriesKeys.map(key => `series=${encodeURIComponent(key)}`).join('&');
 
-  // Fetch both cruise datasets
+  // The server returns the selected lines already aligned by date. A response for a
+  // selection that has since changed is aborted; on an error the last graph stays up.
   useEffect(() => {
-    Promise.all([
-      fetch('https://cruise-price-tracking-webapp.onrender.com/cruises/po').then(res => res.json()),
-      fetch('https://cruise-price-tracking-webapp.onrender.com/cruises/princess').then(res => res.json())
-    ])
-      .then(([poData, princessData]) => {
-        // Normalize dates immediately
-        setPoCruises(poData.map(c => ({ ...c, date_checked: normalizeDate(c.date_checked) })));
-        setPrincessCruises(princessData.map(c => ({ ...c, date_checked: normalizeDate(c.date_checked) })));
+    if (!seriesQuery) {
+      setSeries({ dates: [], series: [] });
+      setError('');
+      return;
+    }
+    const controller = new AbortController();
+    fetchJson(`${API_BASE}/cruises/series?${seriesQuery}&max_points=365`, { signal: controller.signal })
+      .then(data => {
+        setSeries(data);
+        setError('');
       })
-      .catch(err => console.error(err));
-  }, []);
+      .catch(err => {
+        if (err.name === 'AbortError') return;
+        console.error(err);
+        setError(err.message);
+      });
+    return () => controller.abort();
+  }, [seriesQuery]);
 
   const handleChange = (index, field, value) => {
     const updated = [...selectedCruises];
@@ -79,75 +104,30 @@ function PriceGraph() {
 
   const getColor = idx => colors[idx % colors.length];
 
-  const getDataForLine = (line) =>
-    line === 'po' ? poCruises : line === 'princess' ? princessCruises : [];
-
-  const cruiseMap = {
-    ...poCruises.reduce((acc, c) => ({ ...acc, [c.cruise_code]: c.cruise_name }), {}),
-    ...princessCruises.reduce((acc, c) => ({ ...acc, [c.cruise_code]: c.cruise_name }), {})
-  };
+  const cruiseMap = Object.fromEntries(
+    Object.values(options).flatMap(cruises =>
+      Object.entries(cruises).map(([code, c]) => [code, c.cruise_name])
+    )
+  );
 
-  // Build datasets for each selected cruise
-  const chartDataSets = selectedCruises
-    .map(sel => {
-      if (!sel.cruise_code || !sel.cabin_type || !sel.fare_type) return [];
-
-      const data = getDataForLine(sel.cruiseLine)
-        .filter(c =>
-          c.cruise_code === sel.cruise_code &&
-          c.cabin_type === sel.cabin_type &&
-          c.fare_type === sel.fare_type
-        )
-        .map(c => {
-          const base = Number(c.total_price) || 0;
-          const drinks = Number(c.drinks_price) || 0;
-          const total = (sel.includeDrinks && sel.cruiseLine === 'po') ? base + drinks : base;
-
-          return {
-            date: normalizeDate(c.date_checked),
-            total_price: total
-          };
-        });
-
-      // Correct sorting
-      data.sort((a, b) => a.date.localeCompare(b.date));
-
-      return data;
-    })
-    .filter(ds => ds.length > 0);
-
-  // Build merged date list
-  const allDates = Array.from(
-    new Set([
-      ...poCruises.map(c => normalizeDate(c.date_checked)),
-      ...princessCruises.map(c => normalizeDate(c.date_checked))
-    ])
-  ).sort((a, b) => a.localeCompare(b));
-
-  // Merge datasets into one table for Recharts
-  const mergedData = allDates.map(date => {
+  // Recharts wants one row per date with a column per line
+  const mergedData = series.dates.map((date, i) => {
     const row = { date };
-
-    chartDataSets.forEach((ds, idx) => {
-      const entry = ds.find(d => d.date === date);
-      row[`total_price_${idx}`] = entry ? entry.total_price : null;
+    series.series.forEach((s, idx) => {
+      row[`total_price_${idx}`] = s.values[i];
     });
-
     return row;
   });
+  const chartDataSets = series.series;
 
   const getCruiseOptions = (line) =>
-    [...new Set(getDataForLine(line).map(c => c.cruise_code))];
+    Object.keys(options[line] || {});
 
   const getCabinOptions = (line, cruise_code) =>
-    [...new Set(getDataForLine(line)
-      .filter(c => c.cruise_code === cruise_code)
-      .map(c => c.cabin_type))];
+    Object.keys(options[line]?.[cruise_code]?.cabins || {});
 
   const getFareOptions = (line, cruise_code, cabin_type) =>
-    [...new Set(getDataForLine(line)
-      .filter(c => c.cruise_code === cruise_code && c.cabin_type === cabin_type)
-      .map(c => c.fare_type))];
+    options[line]?.[cruise_code]?.cabins?.[cabin_type] || [];
 
   return (
     <div className="price-graph-container">
@@ -230,11 +210,17 @@ function PriceGraph() {
       )}
 
       <div className="add-btn-container">
-        <button className="add-btn" onClick={addCruiseSelection}>
+        <button
+          className="add-btn"
+          onClick={addCruiseSelection}
+          disabled={selectedCruises.length >= MAX_SERIES}
+        >
           Add Another Cruise
         </button>
       </div>
 
+      {error && <p className="error-text">{error}</p>}
+
       {chartDataSets.length > 0 && mergedData.length > 0 && (
         <>
           <LineChart
@@ -279,7 +265,7 @@ function PriceGraph() {
                 type="stepAfter"
                 dataKey={`total_price_${idx}`}
                 stroke={getColor(idx)}
-                name={`${selectedCruises[idx].cruise_code} – ${cruiseMap[selectedCruises[idx].cruise_code] || ''}`}
+                name={`${chartDataSets[idx].cruise_code} – ${chartDataSets[idx].cruise_name || ''}`}
                 connectNulls
               />
             ))}
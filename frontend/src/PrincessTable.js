@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import './App.css';
+import { loadCruises } from './cruiseStore';
 
 function PrincessCruisesTable() {
   const [cruises, setCruises] = useState([]);
@@ -8,8 +9,7 @@ function PrincessCruisesTable() {
   useEffect(() => {
     const fetchCruises = async () => {
       try {
-        const response = await fetch('https://cruise-price-tracking-webapp.onrender.com/cruises/princess');
-        const data = await response.json();
+        const data = await loadCruises('princess');
 
         const uniqueCruises = [];
         const seenCodes = new Set();
@@ -0,0 +1,61 @@
+const API_BASE = 'https://cruise-price-tracking-webapp.onrender.com';
+
+// Keeps each line's price history in localStorage and only asks the backend
+// for observations added or extended since the last visit. Rows are merged by id,
+// so an extended row (later valid_to) replaces the copy already stored.
+// The server's epoch changes when it deletes history (migrate --compact); the
+// stored rows are then thrown away and everything is downloaded again.
+const storageKey = line => `cruises:${line}`;
+
+function emptyStore() {
+  return { epoch: null, cursor: 0, rows: [] };
+}
+
+function readStore(line) {
+  try {
+    const saved = JSON.parse(localStorage.getItem(storageKey(line)));
+    if (saved && Array.isArray(saved.rows)) return saved;
+  } catch (error) {
+    // corrupt or missing - start again from scratch
+  }
+  return emptyStore();
+}
+
+export async function loadCruises(line) {
+  let store = readStore(line);
+  const savedRows = store.rows;
+  let byId = new Map(store.rows.map(row => [row.id, row]));
+
+  try {
+    let more = true;
+    while (more) {
+      const response = await fetch(`${API_BASE}/cruises/${line}/changes?since=${store.cursor}`);
+      if (!response.ok) {
+        throw new Error(`Sync failed (${response.status})`);
+      }
+      const delta = await response.json();
+      if (delta.epoch !== store.epoch && (store.cursor !== 0 || store.rows.length)) {
+        // History was rewritten since the last sync: start again from nothing
+        store = { ...emptyStore(), epoch: delta.epoch };
+        byId = new Map();
+        continue;
+      }
+      store.epoch = delta.epoch;
+      delta.rows.forEach(row => byId.set(row.id, row));
+      store.cursor = delta.cursor;
+      more = delta.more;
+    }
+  } catch (error) {
+    // Offline or a server error - show what we already have and sync next time
+    console.error(`Error syncing ${line} cruises:`, error);
+    return savedRows;
+  }
+  store.rows = [...byId.values()].sort((a, b) => a.id - b.id);
+
+  try {
+    localStorage.setItem(storageKey(line), JSON.stringify(store));
+  } catch (error) {
+    // storage full - still fine, the next visit just downloads everything again
+  }
+  return store.rows;
+}